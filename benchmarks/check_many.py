@@ -0,0 +1,34 @@
+#! /usr/bin/python3
+"""Compare MasterRune.check_many() against a loop of check_with_reason()
+over the same micro-batch.
+
+Usage: ./benchmarks/check_many.py [batchsize] [distinct-runes]
+"""
+import runes
+import sys
+import timeit
+
+batchsize = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+mr = runes.MasterRune(bytes(16))
+restrictions = [runes.Restriction.from_str(s) for s in ('method^get|method^list',
+                                                        'time<2000000000',
+                                                        'path/admin',
+                                                        'peer!|peer=alice')]
+runestrs = [runes.Rune(mr.authcode(), unique_id=i, restrictions=restrictions).to_base64()
+            for i in range(distinct)]
+batch = [runestrs[i % distinct] for i in range(batchsize)]
+values = [{'method': 'getinfo', 'time': 1700000000 + i, 'path': '/api'}
+          for i in range(batchsize)]
+
+assert mr.check_many(batch, values) == [mr.check_with_reason(r, v) for r, v in zip(batch, values)]
+
+loops = 20
+loop_secs = min(timeit.repeat(lambda: [mr.check_with_reason(r, v) for r, v in zip(batch, values)],
+                              number=loops, repeat=5)) / loops
+many_secs = min(timeit.repeat(lambda: mr.check_many(batch, values),
+                              number=loops, repeat=5)) / loops
+print("batch of {} ({} distinct runes)".format(batchsize, distinct))
+print("check_with_reason loop: {:8.1f} usec/rune".format(loop_secs * 1000000 / batchsize))
+print("check_many:             {:8.1f} usec/rune".format(many_secs * 1000000 / batchsize))
@@ -0,0 +1,26 @@
+#! /usr/bin/python3
+"""Time Rune.from_base64 against the number of restrictions: this should
+grow linearly (the per-restriction column should stay flat).
+
+Usage: ./benchmarks/decode.py [maxrestrictions]
+"""
+import runes
+import sys
+import timeit
+
+maxrestr = int(sys.argv[1]) if len(sys.argv) > 1 else 3200
+
+mr = runes.MasterRune(bytes(16))
+print("{:>8} {:>12} {:>16}".format('restrs', 'usec/parse', 'usec/restriction'))
+num = 1
+while num <= maxrestr:
+    rune = mr.copy()
+    for i in range(num):
+        rune.add_restriction(runes.Restriction.from_str('f{}=v\\|{}|g{}<{}'.format(i, i, i, i)))
+    runestr = rune.to_base64()
+
+    loops = max(1, 3200 // num)
+    secs = min(timeit.repeat(lambda: runes.Rune.from_base64(runestr),
+                             number=loops, repeat=3)) / loops
+    print("{:>8} {:>12.1f} {:>16.2f}".format(num, secs * 1000000, secs * 1000000 / num))
+    num *= 2
@@ -0,0 +1,32 @@
+#! /usr/bin/python3
+"""Compare Rune.derive() against copying by re-encoding the restrictions
+(as copy() used to) and adding one, for deriving child runes from a
+base rune with many restrictions.
+
+Usage: ./benchmarks/derive.py [base-restrictions]
+"""
+import runes
+import sys
+import timeit
+
+num = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+base = runes.Rune(bytes(32), unique_id=1,
+                  restrictions=[runes.Restriction.from_str('f{}=value{}'.format(i, i)) for i in range(num)])
+extra = runes.Restriction.from_str('peer=alice')
+
+
+def copy_add():
+    child = runes.Rune.from_authcode(base.authcode(), base.restrictions)
+    child.add_restriction(extra)
+    return child
+
+
+assert copy_add() == base.derive(extra)
+
+loops = 5000
+print("Adding 1 restriction to {}:".format(num))
+for name, fn in (('from_authcode+add', copy_add),
+                 ('derive', lambda: base.derive(extra))):
+    secs = min(timeit.repeat(fn, number=loops, repeat=3)) / loops
+    print("{:>22}: {:8.2f} usec".format(name, secs * 1000000))
@@ -0,0 +1,30 @@
+#! /usr/bin/python3
+"""Compare Rune.compile() against Rune.index() for a rune with many
+restrictions on fields which requests rarely have.
+
+Usage: ./benchmarks/index.py [absent-restrictions]
+"""
+import runes
+import sys
+import timeit
+
+num = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+restrictions = [runes.Restriction.from_str(s) for s in ('method^list|method^get',
+                                                        'time<2000000000')]
+# Restrictions which pass as long as these fields are absent.
+restrictions += [runes.Restriction.from_str('pnum{}!|pnum{}=1'.format(i, i)) for i in range(num)]
+rune = runes.Rune(bytes(32), unique_id=1, restrictions=restrictions)
+values = {'method': 'listpeers', 'time': 1700000000, 'id': 'abc'}
+
+compiled = rune.compile()
+index = rune.index()
+assert compiled(values) == index.are_restrictions_met(values) == (True, '')
+
+loops = 2000
+print("{} restrictions on absent fields:".format(num))
+for name, fn in (('are_restrictions_met', lambda: rune.are_restrictions_met(values)),
+                 ('compile()', lambda: compiled(values)),
+                 ('index()', lambda: index.are_restrictions_met(values))):
+    secs = min(timeit.repeat(fn, number=loops, repeat=3)) / loops
+    print("{:>22}: {:8.2f} usec".format(name, secs * 1000000))
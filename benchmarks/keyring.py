@@ -0,0 +1,38 @@
+#! /usr/bin/python3
+"""Compare MasterRuneRing against trying several MasterRunes in turn,
+when most runes come from the newest secret.
+
+Usage: ./benchmarks/keyring.py [num-secrets]
+"""
+import runes
+import sys
+import timeit
+from runes.keyring import MasterRuneRing
+
+num = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+secrets = [bytes([i] * 16) for i in range(num)]
+masters = [runes.MasterRune(s) for s in secrets]
+ring = MasterRuneRing({i: s for i, s in enumerate(secrets)})
+restrictions = [runes.Restriction.from_str('method^list|method^get'),
+                runes.Restriction.from_str('time<2000000000')]
+runestr = runes.MasterRune(secrets[-1], restrictions, unique_id=1).to_base64()
+values = {'method': 'listpeers', 'time': 1700000000}
+
+
+def try_each():
+    for master in masters:
+        ok, whyfail = master.check_with_reason(runestr, values)
+        if whyfail != 'rune authcode invalid':
+            return ok, whyfail
+    return False, 'rune authcode invalid'
+
+
+assert try_each() == ring.check_with_reason(runestr, values) == (True, '')
+
+loops = 5000
+print("{} secrets, rune from the newest:".format(num))
+for name, fn in (('MasterRune each', try_each),
+                 ('MasterRuneRing', lambda: ring.check_with_reason(runestr, values))):
+    secs = min(timeit.repeat(fn, number=loops, repeat=3)) / loops
+    print("{:>22}: {:8.2f} usec".format(name, secs * 1000000))
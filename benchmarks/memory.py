@@ -0,0 +1,46 @@
+#! /usr/bin/python3
+"""Measure the memory held by parsed Runes, as you'd keep them resident
+in a session table: freshly parsed, then after they've been tested
+(whatever that caches stays with the rune too).
+
+Usage: ./benchmarks/memory.py [count]
+"""
+import runes
+import sys
+import tracemalloc
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+mr = runes.MasterRune(bytes(16))
+restrictions = [runes.Restriction.from_str(s) for s in ('method^list|method^get',
+                                                        'method/listdatastore',
+                                                        'time<2000000000',
+                                                        'peer=alice|peer=bob')]
+runestrs = [runes.Rune(mr.authcode(), unique_id=i, restrictions=restrictions).to_base64()
+            for i in range(count)]
+values = {'method': 'listpeers', 'time': 1000, 'peer': 'carol'}
+
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+parsed = [runes.Rune.from_base64(r) for r in runestrs]
+stages = [('parsed', tracemalloc.get_traced_memory()[0])]
+
+for rune in parsed:
+    rune.are_restrictions_met(values)
+stages.append(('+ are_restrictions_met()', tracemalloc.get_traced_memory()[0]))
+
+if hasattr(runes.Rune, 'is_met'):
+    for rune in parsed:
+        rune.is_met(values)
+    stages.append(('+ is_met()', tracemalloc.get_traced_memory()[0]))
+
+for rune in parsed:
+    mr.is_rune_authorized(rune)
+stages.append(('+ is_rune_authorized()', tracemalloc.get_traced_memory()[0]))
+tracemalloc.stop()
+
+print("{} runes of {} restrictions ({} alternatives):"
+      .format(count, len(parsed[0].restrictions),
+              sum(len(r.alternatives) for r in parsed[0].restrictions)))
+for name, after in stages:
+    print("  {}: {:.0f} bytes/rune".format(name, (after - before) / count))
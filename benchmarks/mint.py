@@ -0,0 +1,31 @@
+#! /usr/bin/python3
+"""Compare MasterRune.mint_many() against building each rune with
+MasterRune(secret, restrictions, unique_id).
+
+Usage: ./benchmarks/mint.py [count]
+"""
+import runes
+import sys
+import time
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+secret = bytes(16)
+restrictions = [runes.Restriction.from_str(s) for s in ('method^list|method^get',
+                                                        'method/listdatastore',
+                                                        'time<2000000000')]
+mr = runes.MasterRune(secret)
+
+start = time.perf_counter()
+for i in range(count):
+    runes.MasterRune(secret, restrictions, unique_id=i).to_base64()
+each = time.perf_counter() - start
+
+start = time.perf_counter()
+for runestr in mr.mint_many(range(count), restrictions):
+    pass
+many = time.perf_counter() - start
+
+print("minting {} runes:".format(count))
+print("MasterRune() each: {:8.1f} usec/rune".format(each * 1000000 / count))
+print("mint_many():       {:8.1f} usec/rune".format(many * 1000000 / count))
@@ -0,0 +1,34 @@
+#! /usr/bin/python3
+"""Compare VerifierPool against multiprocessing.Pool.imap() (as
+`python3 -m runes` uses) for checking a burst of runestrings.
+
+Usage: ./benchmarks/pool.py [num-runes] [processes]
+"""
+import multiprocessing
+import runes
+import sys
+import time
+from runes.__main__ import _check, _init_worker
+from runes.pool import VerifierPool
+
+num = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+processes = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+
+secret = bytes(16)
+restrictions = [runes.Restriction.from_str('method^list|method^get'),
+                runes.Restriction.from_str('time<2000000000')]
+runestrs = list(runes.MasterRune(secret).mint_many(range(num), restrictions))
+values = {'method': 'listpeers', 'time': 1700000000}
+
+print("{} runes on {} processes:".format(num, processes))
+with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(secret, values)) as mppool:
+    start = time.perf_counter()
+    assert all(ok for _, ok, _ in mppool.imap(_check, enumerate(runestrs), 256))
+    secs = time.perf_counter() - start
+print("{:>22}: {:8.0f} runes/sec".format('Pool.imap', num / secs))
+
+with VerifierPool(secret, processes, values=values) as pool:
+    start = time.perf_counter()
+    assert all(ok for ok, _ in pool.map(runestrs))
+    secs = time.perf_counter() - start
+print("{:>22}: {:8.0f} runes/sec".format('VerifierPool.map', num / secs))
@@ -0,0 +1,159 @@
+#! /usr/bin/python3
+"""Time the hot paths (parsing, authorizing, evaluating, encoding and
+extending runes) across rune sizes, so regressions show up.
+
+Usage: ./benchmarks/run.py [--sizes 1,10,50,200] [-k NAME] [--json FILE]
+       ./benchmarks/run.py --compare OLD.json NEW.json [--threshold PCT]
+
+Each result is the best of several repeats, in microseconds per call.
+With --json, results (and the python version and SHA-256 backend) are
+written to FILE.  --compare prints the change between two such files,
+and exits 1 if anything got more than --threshold percent slower.
+"""
+import argparse
+import json
+import platform
+import runes
+import sys
+import time
+import timeit
+from runes.midstate import BACKEND
+from typing import Any, Callable, Dict, List, Tuple
+
+SECRET = bytes(16)
+
+
+def make_rune(mr: runes.MasterRune, num: int) -> runes.Rune:
+    """A rune with num two-alternative restrictions, all of which pass make_values()"""
+    rune = mr.copy()
+    for i in range(num):
+        rune.add_restriction(runes.Restriction.from_str('f{}=v\\|{}|g{}<{}'.format(i, i, i, i)))
+    return rune
+
+
+def make_values(num: int) -> Dict[str, Any]:
+    return {'f{}'.format(i): 'v|{}'.format(i) for i in range(num)}
+
+
+def make_callable_values(num: int) -> Dict[str, Any]:
+    values: Dict[str, Any] = {}
+    for i in range(num):
+        expect = 'v|{}'.format(i)
+        values['f{}'.format(i)] = lambda alt, expect=expect: None if alt.value == expect else 'mismatch'
+    return values
+
+
+def cases(num: int) -> Dict[str, Callable[[], Any]]:
+    """The benchmarks for a rune of num restrictions: name -> function to time"""
+    mr = runes.MasterRune(SECRET)
+    rune = make_rune(mr, num)
+    runestr = rune.to_base64()
+    rstr = rune.to_str()
+    values = make_values(num)
+    callable_values = make_callable_values(num)
+    index = rune.index()
+    new_restr = runes.Restriction.from_str('f=v|g<1')
+
+    def add_restriction() -> None:
+        # Copy, since otherwise the rune would keep growing.
+        rune.copy().add_restriction(new_restr)
+
+    return {
+        'from_base64': lambda: runes.Rune.from_base64(runestr),
+        'from_str': lambda: runes.Rune.from_str(rstr),
+        'is_rune_authorized': lambda: mr.is_rune_authorized(rune),
+        'are_restrictions_met': lambda: rune.are_restrictions_met(values),
+        'are_restrictions_met_callable': lambda: rune.are_restrictions_met(callable_values),
+        'are_restrictions_met_indexed': lambda: index.are_restrictions_met(values),
+        'is_met': lambda: rune.is_met(values),
+        'check_with_reason': lambda: runes.check_with_reason(SECRET, runestr, values),
+        'to_base64': rune.to_base64,
+        'add_restriction': add_restriction,
+    }
+
+
+def timeone(fn: Callable[[], Any], mintime: float, repeat: int) -> float:
+    """Best time per call, in microseconds"""
+    loops = 1
+    # Calibrate so each repeat takes at least mintime.
+    while True:
+        secs = timeit.timeit(fn, number=loops)
+        if secs >= mintime:
+            break
+        loops *= 2 if secs == 0 else max(2, int(mintime / secs * 1.2))
+    best = min([secs] + timeit.repeat(fn, number=loops, repeat=repeat - 1))
+    return best / loops * 1000000
+
+
+def run(sizes: List[int], names: List[str], mintime: float, repeat: int) -> Dict[str, float]:
+    results = {}
+    for num in sizes:
+        for name, fn in cases(num).items():
+            if names and not any(n in name for n in names):
+                continue
+            key = '{}/{}'.format(name, num)
+            results[key] = timeone(fn, mintime, repeat)
+            print("{:<40} {:>12.2f} usec".format(key, results[key]))
+    return results
+
+
+def compare(old: Dict[str, float], new: Dict[str, float], threshold: float) -> Tuple[List[str], List[str]]:
+    """Returns a table of lines, and the names which regressed by more than threshold percent"""
+    lines = ["{:<40} {:>12} {:>12} {:>8}".format('benchmark', 'old usec', 'new usec', 'change')]
+    regressed = []
+    for key in old:
+        if key not in new:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        mark = ''
+        if change > threshold:
+            regressed.append(key)
+            mark = ' !'
+        lines.append("{:<40} {:>12.2f} {:>12.2f} {:>+7.1f}%{}"
+                     .format(key, old[key], new[key], change, mark))
+    return lines, regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the runes hot paths")
+    parser.add_argument('--sizes', default='1,10,50,200',
+                        help="comma-separated numbers of restrictions per rune")
+    parser.add_argument('-k', dest='names', action='append', default=[],
+                        help="only run benchmarks whose names contain this (can repeat)")
+    parser.add_argument('--mintime', type=float, default=0.1,
+                        help="minimum seconds per repeat")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="compare two --json files instead of running")
+    parser.add_argument('--threshold', type=float, default=10,
+                        help="percent slowdown which counts as a regression for --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        lines, regressed = compare(old['results'], new['results'], args.threshold)
+        print('\n'.join(lines))
+        if regressed:
+            print("{} benchmarks more than {}% slower".format(len(regressed), args.threshold),
+                  file=sys.stderr)
+            return 1
+        return 0
+
+    results = run([int(s) for s in args.sizes.split(',')], args.names,
+                  args.mintime, args.repeat)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'backend': BACKEND,
+                       'version': runes.__version__,
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'results': results}, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#! /usr/bin/python3
+"""Compare RuneSet.matching() against calling are_restrictions_met() on
+every rune, to find which stored runes permit a request.
+
+Usage: ./benchmarks/runeset.py [num-runes]
+"""
+import runes
+import sys
+import time
+from runes.runeset import RuneSet
+
+num = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+runelist = []
+for i in range(num):
+    restrs = ['method^list|method=getinfo' if i % 2 else 'method=pay',
+              'time<{}'.format(1700000000 + i),
+              'peer={}|peer!'.format(i % 1000)]
+    runelist.append(runes.Rune(bytes(32), unique_id=i,
+                               restrictions=[runes.Restriction.from_str(r) for r in restrs]))
+values = {'method': 'listpeers', 'time': 1700000000 + num // 2, 'peer': '7'}
+
+start = time.perf_counter()
+runeset = RuneSet(runelist)
+print("{} runes: building RuneSet took {:.2f} sec".format(num, time.perf_counter() - start))
+
+start = time.perf_counter()
+expect = [i for i, r in enumerate(runelist) if r.are_restrictions_met(values)[0]]
+loop = time.perf_counter() - start
+
+start = time.perf_counter()
+got = runeset.matching(values)
+indexed = time.perf_counter() - start
+assert got == expect
+
+print("{:>22}: {:10.2f} msec".format('are_restrictions_met', loop * 1000))
+print("{:>22}: {:10.2f} msec ({} match)".format('RuneSet.matching', indexed * 1000, len(got)))
@@ -0,0 +1,32 @@
+#! /usr/bin/python3
+"""Time MasterRune.check_many_parallel() on 1 to 8 threads.
+
+With the GIL, only hashing long runes (hashlib releases it for 2048
+bytes or more) runs in parallel; a free-threaded Python scales the
+rest too.
+
+Usage: ./benchmarks/threads.py [num-runes] [restrictions-per-rune]
+"""
+import runes
+import sys
+import time
+
+num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+nrestr = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+master = runes.MasterRune(bytes(16))
+restrictions = [runes.Restriction.from_str('field{}/{}'.format(i, 'x' * 20)) for i in range(nrestr)]
+runestrs = list(master.mint_many(range(num), restrictions))
+values_list = [{}] * num
+
+gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+print("{} runes of {} restrictions, GIL {}:".format(num, nrestr, 'enabled' if gil else 'disabled'))
+expect = master.check_many(runestrs, values_list)
+base = None
+for threads in (1, 2, 4, 8):
+    start = time.perf_counter()
+    assert master.check_many_parallel(runestrs, values_list, max_workers=threads) == expect
+    secs = time.perf_counter() - start
+    if base is None:
+        base = secs
+    print("{:>3} threads: {:8.0f} checks/sec ({:.2f}x)".format(threads, num / secs, base / secs))
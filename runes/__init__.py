@@ -1,4 +1,7 @@
-from .runes import Alternative, Restriction, Rune, MasterRune, check_with_reason, check, end_shastream
+from .runes import Alternative, Restriction, Rune, MasterRune, Reason, RuneCache, RuneIndex, check_with_reason, check, clear_check_cache, end_shastream
+from .keyring import MasterRuneRing
+from .revocation import RevocationSet
+from .runeset import RuneSet
 
 __version__ = "0.5"
 
@@ -6,7 +9,14 @@ __all__ = ['Alternative',
            'Restriction',
            'Rune',
            'MasterRune',
+           'MasterRuneRing',
+           'Reason',
+           'RuneCache',
+           'RuneIndex',
+           'RevocationSet',
+           'RuneSet',
            'check_with_reason',
            'check',
+           'clear_check_cache',
            # Needed for pytest, apparently.  WTF.
            'end_shastream']
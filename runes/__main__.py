@@ -0,0 +1,195 @@
+"""Verify runestrings in bulk: python3 -m runes --secret HEX [FILE...]
+
+Reads newline-separated runestrings from the files (or stdin), and
+checks each one was derived from the secret.  With --values, it also
+tests their restrictions against that JSON object.  With --revoked,
+runes whose unique_id is in that RevocationSet snapshot fail.  Each line of
+output is PASS or FAIL, the runestring and (on failure) the reason.
+
+Work is spread over a process pool (--jobs): each worker builds the
+MasterRune once when it starts, so the secret isn't sent with each
+rune.  Workers map the revocation snapshot, so they share one copy.  Throughput goes to stderr at the end.
+"""
+import argparse
+import fileinput
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .revocation import RevocationSet
+from .runes import MasterRune
+
+# Per-process state, set up by _init_worker()
+_master: Optional[MasterRune] = None
+_values: Optional[Dict[str, Any]] = None
+
+
+def _init_worker(secret: bytes, values: Optional[Dict[str, Any]],
+                 revoked: Optional[str] = None) -> None:
+    global _master, _values
+    revocations = None
+    if revoked is not None:
+        revocations = RevocationSet.load(revoked)
+    _master = MasterRune(secret, revocations=revocations)
+    _values = values
+
+
+def _check(item: Tuple[int, str]) -> Tuple[int, bool, str]:
+    """Returns the index of the runestring, whether it passed, and why not"""
+    assert _master is not None
+    idx, runestr = item
+    if _values is None:
+        rune, whyfail = _master._authorized_rune(runestr)
+        return idx, rune is not None, whyfail
+    ok, whyfail = _master.check_with_reason(runestr, _values)
+    return idx, ok, whyfail
+
+
+def _runestrings(files: List[str]) -> Iterator[str]:
+    with fileinput.input(files) as lines:
+        for line in lines:
+            line = line.strip()
+            if line != '':
+                yield line
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python3 -m runes',
+                                     description="Verify runestrings against a secret")
+    parser.add_argument('--secret', required=True,
+                        help="the master secret, in hex")
+    parser.add_argument('--values',
+                        help="JSON object of values to test restrictions against"
+                        " (otherwise only the authcode is checked)")
+    parser.add_argument('--revoked',
+                        help="RevocationSet snapshot file of revoked unique_ids")
+    parser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument('--unordered', action='store_true',
+                        help="output results as they finish, not in input order")
+    parser.add_argument('--chunksize', type=int, default=256,
+                        help="runestrings handed to a worker at once")
+    parser.add_argument('files', nargs='*',
+                        help="files of runestrings, one per line (default: stdin)")
+    args = parser.parse_args(argv)
+
+    try:
+        secret = bytes.fromhex(args.secret)
+    except ValueError:
+        parser.error("--secret must be hex")
+    if len(secret) + 1 + 8 > 64:
+        parser.error("--secret must be at most 55 bytes")
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.chunksize < 1:
+        parser.error("--chunksize must be at least 1")
+
+    values = None
+    if args.values is not None:
+        try:
+            values = json.loads(args.values)
+        except ValueError:
+            values = None
+        if not isinstance(values, dict):
+            parser.error("--values must be a JSON object")
+
+    if args.revoked is not None:
+        # Fail now, not in every worker.
+        try:
+            RevocationSet.load(args.revoked)
+        except (OSError, ValueError) as e:
+            parser.error("--revoked: {}".format(e))
+
+    start = time.perf_counter()
+    passed = failed = 0
+
+    # Pool.imap() would read all the input at once, so we only let it
+    # have so many runestrings outstanding.  We read in our own thread,
+    # not the pool's: if we stop early, the pool's thread must not be
+    # stuck waiting for the window (or input), or terminate() hangs.
+    window = threading.Semaphore(args.jobs * args.chunksize * 4)
+    pending: Dict[int, str] = {}
+    stopped = threading.Event()
+    # (idx, runestr), then None at the end.
+    todo: 'queue.Queue[Optional[Tuple[int, str]]]' = queue.Queue()
+    readerror: List[BaseException] = []
+
+    def read() -> None:
+        try:
+            for idx, runestr in enumerate(_runestrings(args.files)):
+                window.acquire()
+                if stopped.is_set():
+                    break
+                pending[idx] = runestr
+                todo.put((idx, runestr))
+        except BaseException as e:
+            readerror.append(e)
+        todo.put(None)
+
+    def feed() -> Iterator[Tuple[int, str]]:
+        while True:
+            item = todo.get()
+            if item is None:
+                if readerror:
+                    raise readerror[0]
+                return
+            yield item
+
+    pool = None
+    results: Iterable[Tuple[int, bool, str]]
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, initializer=_init_worker,
+                                    initargs=(secret, values, args.revoked))
+        if args.unordered:
+            results = pool.imap_unordered(_check, feed(), args.chunksize)
+        else:
+            results = pool.imap(_check, feed(), args.chunksize)
+    else:
+        _init_worker(secret, values, args.revoked)
+        results = map(_check, feed())
+    # Only once the pool has forked: its workers close stdin, which
+    # deadlocks if we're already reading it.
+    threading.Thread(target=read, daemon=True).start()
+
+    try:
+        for idx, ok, whyfail in results:
+            runestr = pending.pop(idx)
+            window.release()
+            if ok:
+                passed += 1
+                print("PASS\t{}".format(runestr))
+            else:
+                failed += 1
+                print("FAIL\t{}\t{}".format(runestr, whyfail))
+    except BrokenPipeError:
+        # Whoever reads our output stopped (e.g. `| head`).  Point stdout
+        # at /dev/null so flushing it at exit doesn't complain again.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        # Let feed() (and so the pool's task thread) finish.
+        stopped.set()
+        window.release()
+        todo.put(None)
+        if pool is not None:
+            pool.terminate()
+
+    secs = time.perf_counter() - start
+    print("Checked {} runes in {:.2f} seconds ({:.0f}/sec): {} passed, {} failed"
+          .format(passed + failed, secs, (passed + failed) / secs if secs else 0,
+                  passed, failed),
+          file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
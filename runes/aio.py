@@ -0,0 +1,108 @@
+"""Helpers for checking runes from asyncio code.
+
+Rune.are_restrictions_met_async() and MasterRune.check_with_reason_async()
+await callables in values which return awaitables.  If those callables
+look things up in a remote store (revocations, rate limits...),
+BatchLookup lets the checks running concurrently share one round trip:
+
+    async def fetch(ids):
+        rows = await db.fetch('SELECT id FROM revoked WHERE id = ANY($1)', ids)
+        return {row['id']: True for row in rows}
+
+    revoked = BatchLookup(fetch, default=False)
+
+    async def check_id(alt):
+        if await revoked.lookup(alt.value):
+            return 'id: revoked'
+        return None
+
+    ok, whyfail = await master.check_with_reason_async(runestr, {'': check_id, ...})
+
+This is a separate module so that `import runes` doesn't import asyncio.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+
+class BatchLookup(object):
+    """Coalesces lookup(key) calls made around the same time into a single
+call of fetch(keys), an async function taking a list of distinct keys
+and returning a dict of their results (keys it leaves out get
+default).
+
+Lookups of a key which is already waiting for (or in) a batch share
+its result.  Lookups are collected until the event loop has run
+everything which was ready when the first one arrived (or for delay
+seconds, if set), or until there are maxbatch of them.  If fetch raises, every lookup in
+that batch raises the same exception; if the fetch is cancelled, so are
+they.
+
+    """
+    def __init__(self,
+                 fetch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 default: Any = None,
+                 delay: float = 0,
+                 maxbatch: Optional[int] = None):
+        self.fetch = fetch
+        self.default = default
+        self.delay = delay
+        self.maxbatch = maxbatch
+        self.batches = 0
+        self._pending: Dict[Hashable, 'asyncio.Future[Any]'] = {}
+        # Keys in batches being fetched now.
+        self._inflight: Dict[Hashable, 'asyncio.Future[Any]'] = {}
+        self._flush_handle: Optional[asyncio.Handle] = None
+        # The event loop only keeps weak references to tasks.
+        self._tasks: Set['asyncio.Future[None]'] = set()
+
+    async def lookup(self, key: Hashable) -> Any:
+        """The result for key, from the next batch"""
+        fut = self._pending.get(key)
+        if fut is None:
+            fut = self._inflight.get(key)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            self._pending[key] = fut
+            if self.maxbatch is not None and len(self._pending) >= self.maxbatch:
+                self._flush()
+            elif self._flush_handle is None:
+                if self.delay:
+                    self._flush_handle = loop.call_later(self.delay, self._flush)
+                else:
+                    self._flush_handle = loop.call_soon(self._flush)
+        # Other lookups share this future: don't let our cancellation
+        # cancel theirs.
+        return await asyncio.shield(fut)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self.batches += 1
+            self._inflight.update(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, 'asyncio.Future[Any]']) -> None:
+        try:
+            results = await self.fetch(list(batch))
+        except Exception as e:
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for key, fut in batch.items():
+                if not fut.done():
+                    fut.set_result(results.get(key, self.default))
+        finally:
+            # Cancelled (or worse): don't leave the lookups waiting.
+            for fut in batch.values():
+                if not fut.done():
+                    fut.cancel()
+            for key, fut in batch.items():
+                if self._inflight.get(key) is fut:
+                    del self._inflight[key]
@@ -0,0 +1,140 @@
+"""Accept runes minted under any of several secrets, e.g. while rotating.
+
+A MasterRuneRing parses each runestring and encodes its restrictions
+once, then tries each secret's precomputed hash state in turn: the
+secret which most recently authorized a rune first, so while most runes
+come from one secret, most checks cost a single hash.  If you mint runes
+with a unique_id version per secret, map those versions to secrets and
+such runes are only ever checked against their own.
+
+It reports which secret authorized each rune, and counts them in
+`matches`, so you can tell when an old secret is no longer in use.
+"""
+import threading
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple
+
+from .revocation import RevocationSet
+from .runes import MasterRune, Rune, _rune_id
+
+
+def _rune_version(rune: Rune) -> Optional[str]:
+    """The version of the rune's unique_id, if it has one"""
+    if rune.restrictions:
+        alt = rune.restrictions[0].alternatives[0]
+        if alt.is_unique_id() and '-' in alt.value:
+            return alt.value.split('-', 1)[1]
+    return None
+
+
+class MasterRuneRing(object):
+    """Several MasterRunes (with no restrictions), named by key: secrets
+maps each key to its secret, and they're first tried in that order.
+
+versions maps unique_id versions to keys: a rune with one of those
+versions is authorized by that key's secret, or not at all.  Other
+runes are tried against every secret, most recently successful first.
+
+If revocations (a RevocationSet) is set, runes whose unique_id is in
+it fail with "id: revoked".
+
+    """
+    def __init__(self,
+                 secrets: Mapping[Hashable, bytes],
+                 versions: Optional[Mapping[str, Hashable]] = None,
+                 revocations: Optional[RevocationSet] = None):
+        self._masters: Dict[Hashable, MasterRune] = {}
+        # Order to try keys in: replaced (never modified) under _lock.
+        self._order: List[Hashable] = []
+        self._lock = threading.Lock()
+        self.versions: Dict[str, Hashable] = dict(versions or {})
+        self.revocations = revocations
+        # How many runes each key has authorized.
+        self.matches: Counter = Counter()
+        for key, secret in secrets.items():
+            self.add(key, secret)
+
+    def add(self, key: Hashable, secret: bytes) -> None:
+        """Accept runes from this secret too (tried last, until it's
+        used).  Replaces any secret already under key."""
+        master = MasterRune(secret)
+        with self._lock:
+            self._masters[key] = master
+            self._order = [k for k in self._order if k != key] + [key]
+
+    def remove(self, key: Hashable) -> None:
+        """Stop accepting runes from key's secret"""
+        with self._lock:
+            del self._masters[key]
+            self._order = [k for k in self._order if k != key]
+
+    def keys(self) -> List[Hashable]:
+        """The keys, in the order we'll try them"""
+        return list(self._order)
+
+    def _used(self, key: Hashable) -> None:
+        """Note key authorized a rune, and try it first from now on"""
+        with self._lock:
+            self.matches[key] += 1
+            # remove() may have dropped key (maybe leaving _order empty)
+            # since matching_key() found it.
+            if key in self._masters and self._order[0] != key:
+                self._order = [key] + [k for k in self._order if k != key]
+
+    def matching_key(self, rune: Rune) -> Optional[Hashable]:
+        """The key whose secret rune derives from, or None"""
+        encs = [r._encode_bytes() for r in rune.restrictions]
+        authcode = rune.authcode()
+
+        version = _rune_version(rune)
+        if version is not None and version in self.versions:
+            key = self.versions[version]
+            master = self._masters.get(key)
+            if master is not None and master._authcode_of(encs) == authcode:
+                self._used(key)
+                return key
+            return None
+
+        for key in self._order:
+            master = self._masters.get(key)
+            if master is not None and master._authcode_of(encs) == authcode:
+                self._used(key)
+                return key
+        return None
+
+    def authorize(self, b64str: str) -> Tuple[Optional[Rune], Optional[Hashable], str]:
+        """The Rune and the key which authorized it, if b64str is valid
+        and derives from one of our secrets, otherwise None, None and the
+        reason"""
+        try:
+            rune = Rune.from_base64(b64str)
+        except:  # noqa: E722
+            return None, None, "runestring invalid"
+        key = self.matching_key(rune)
+        if key is None:
+            return None, None, "rune authcode invalid"
+        if self.revocations is not None and _rune_id(rune) in self.revocations:
+            return None, None, "id: revoked"
+        return rune, key, ''
+
+    def check_with_key(self, b64str: str, values: Dict[str, Any]) -> Tuple[bool, str, Optional[Hashable]]:
+        """check_with_reason(), plus the key whose secret authorized the
+        rune (even if its restrictions then failed), or None"""
+        rune, key, whyfail = self.authorize(b64str)
+        if rune is None:
+            return False, whyfail, None
+        ok, whyfail = rune.are_restrictions_met(values)
+        return ok, whyfail, key
+
+    def check_with_reason(self, b64str: str, values: Dict[str, Any]) -> Tuple[bool, str]:
+        """Same as MasterRune.check_with_reason(), for any of our secrets"""
+        rune, _, whyfail = self.authorize(b64str)
+        if rune is None:
+            return False, whyfail
+        return rune.are_restrictions_met(values)
+
+    def check(self, b64str: str, values: Dict[str, Any]) -> bool:
+        """Same as self.check_with_reason(b64str, values)[0], but never
+        formats a reason"""
+        rune, _, _ = self.authorize(b64str)
+        return rune is not None and rune.is_met(values)
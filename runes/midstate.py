@@ -0,0 +1,140 @@
+"""SHA-256 with midstate access, which hashlib doesn't give us.
+
+Runes need to set the internal state (and length) of SHA-256 to
+continue hashing from an authcode.  We do this by calling OpenSSL's
+(long-deprecated, but still exported) SHA256_* functions using
+ctypes, falling back to the `sha256` package if we can't find them.
+
+Either way, `sha256()` objects have `update()`, `digest()`,
+`hexdigest()` and a `state` property, which is a tuple of (32-byte
+midstate, number of bytes hashed).  You should only set the state
+at a 64-byte block boundary.
+
+Set RUNES_SHA256_BACKEND=sha256 in the environment to force the
+`sha256` package, or =openssl to insist on OpenSSL.
+"""
+import ctypes
+import os
+import struct
+from typing import Any, Optional, Tuple
+
+
+def _load_libcrypto() -> Optional[Any]:
+    """Find the SHA256_* functions, preferring the OpenSSL hashlib uses"""
+    candidates = []
+    try:
+        import _hashlib  # type: ignore
+        candidates.append(_hashlib.__file__)
+    except (ImportError, AttributeError):
+        pass
+    # Never try unversioned names: that aborts the process on macOS.
+    candidates += ['libcrypto.so.3', 'libcrypto.so.1.1',
+                   'libcrypto.3.dylib', 'libcrypto.1.1.dylib',
+                   'libcrypto-3-x64.dll', 'libcrypto-1_1-x64.dll']
+    for name in candidates:
+        try:
+            lib = ctypes.CDLL(name)
+            lib.SHA256_Init
+            lib.SHA256_Update
+            lib.SHA256_Final
+        except (OSError, AttributeError):
+            continue
+        # Without argtypes, ctypes would pass anything it can (a str
+        # as a wchar_t buffer!), and a length bigger than an int wrong.
+        # (Our ctx type converts faster than c_void_p.)
+        lib.SHA256_Init.argtypes = [_CTX]
+        lib.SHA256_Update.argtypes = [_CTX, ctypes.c_char_p, ctypes.c_size_t]
+        lib.SHA256_Final.argtypes = [ctypes.c_char_p, _CTX]
+        for fn in (lib.SHA256_Init, lib.SHA256_Update, lib.SHA256_Final):
+            fn.restype = ctypes.c_int
+        return lib
+    return None
+
+
+# typedef struct SHA256state_st {
+#     SHA_LONG h[8];
+#     SHA_LONG Nl, Nh;
+#     SHA_LONG data[SHA_LBLOCK];
+#     unsigned int num, md_len;
+# } SHA256_CTX;
+_CTX = ctypes.c_char * (8 * 4 + 4 + 4 + 16 * 4 + 4 + 4)
+_CTX_H = struct.Struct('=8I')
+_CTX_HEAD = struct.Struct('=10I')
+_CTX_NUM = struct.Struct('=I')
+_CTX_NUM_OFF = ctypes.sizeof(_CTX) - 8
+_MIDSTATE = struct.Struct('>8I')
+
+
+class OpenSSLSha256(object):
+    """SHA-256 using OpenSSL's SHA256_CTX, which we can poke the state into"""
+    __slots__ = ('_ctx', '_length')
+
+    def __init__(self) -> None:
+        # Faster than calling SHA256_Init() every time.
+        self._ctx = _CTX.from_buffer_copy(_initial_ctx)
+        # Cheaper to track than to extract from Nl and Nh.
+        self._length = 0
+
+    def update(self, data: bytes) -> None:
+        # Only bytes, like the sha256 package.
+        if not isinstance(data, bytes):
+            raise TypeError("expected bytes, got {}".format(type(data).__name__))
+        _SHA256_Update(self._ctx, data, len(data))
+        self._length += len(data)
+
+    @property
+    def state(self) -> Tuple[bytes, int]:
+        return _MIDSTATE.pack(*_CTX_H.unpack_from(self._ctx)), self._length
+
+    @state.setter
+    def state(self, state: Tuple[bytes, int]) -> None:
+        midstate, length = state
+        bits = length * 8
+        _CTX_HEAD.pack_into(self._ctx, 0,
+                            *_MIDSTATE.unpack(midstate),
+                            bits & 0xFFFFFFFF, bits >> 32)
+        # Nothing buffered.
+        _CTX_NUM.pack_into(self._ctx, _CTX_NUM_OFF, 0)
+        self._length = length
+
+    def digest(self) -> bytes:
+        # Finalize a copy, so we can keep going.
+        ctx = _CTX.from_buffer_copy(self._ctx)
+        md = ctypes.create_string_buffer(32)
+        _SHA256_Final(md, ctx)
+        return md.raw
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+_libcrypto: Optional[Any] = None
+_backend = os.environ.get('RUNES_SHA256_BACKEND')
+if _backend != 'sha256':
+    _libcrypto = _load_libcrypto()
+    if _libcrypto is None and _backend == 'openssl':
+        raise ImportError("RUNES_SHA256_BACKEND=openssl but no usable libcrypto")
+
+if _libcrypto is not None:
+    _init = _CTX()
+    _libcrypto.SHA256_Init(_init)
+    _initial_ctx = bytes(_init)
+    # Make sure SHA256_CTX is laid out the way we expect.
+    if _CTX_HEAD.unpack_from(_initial_ctx) != (0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+                                               0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+                                               0, 0):
+        if _backend == 'openssl':
+            raise ImportError("RUNES_SHA256_BACKEND=openssl but SHA256_CTX is unexpected")
+        _libcrypto = None
+
+sha256: Any
+if _libcrypto is not None:
+    _SHA256_Update = _libcrypto.SHA256_Update
+    _SHA256_Final = _libcrypto.SHA256_Final
+    BACKEND = 'openssl'
+    sha256 = OpenSSLSha256
+else:
+    # We can't use the hashlib one, since we need midstate access :(
+    import sha256 as _sha256  # type: ignore
+    BACKEND = 'sha256'
+    sha256 = _sha256.sha256
@@ -0,0 +1,384 @@
+"""A process pool for verifying runestrings in bulk.
+
+Each worker process builds its MasterRune once, when it starts: the
+secret is never sent with the work.  Runestrings and results don't go
+through pipes either: they are written into fixed-size slots in a
+multiprocessing.shared_memory block, and only slot numbers pass through
+two rings in the same block (one of submitted slots, which the workers
+take from, and one of finished slots, which a thread in the submitting
+process reads to complete the futures).
+
+There are only so many slots, so submit() blocks while they are all in
+use: a burst of work can't grow without limit in memory.
+
+    with VerifierPool(secret, values={'time': int(time.time())}) as pool:
+        for (ok, whyfail), runestr in zip(pool.map(runestrs), runestrs):
+            ...
+"""
+import collections
+import json
+import multiprocessing
+import multiprocessing.connection
+import struct
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .revocation import RevocationSet
+from .runes import MasterRune
+
+# Counters at the start: the next task ring entry for a worker to take
+# (under the task lock), then the next done ring entry for a worker to
+# fill (under the done lock).
+_COUNTER = struct.Struct('<Q')
+_TASKHEAD = 0
+_DONETAIL = _COUNTER.size
+_INDEX = struct.Struct('<I')
+# Request: runestring length, values JSON length (0xFFFFFFFF for none).
+_REQUEST = struct.Struct('<II')
+# Response: passed, reason length.
+_RESPONSE = struct.Struct('<BI')
+_NO_VALUES = 0xFFFFFFFF
+# Task ring entry telling a worker to exit, and done ring entry telling
+# the collector to.
+_STOP = 0xFFFFFFFF
+
+
+class _Layout(object):
+    """Where things are in the shared memory"""
+    def __init__(self, slots: int, slotsize: int, workers: int):
+        self.slots = slots
+        self.slotsize = slotsize
+        # Room for every slot, and a stop for each worker.
+        self.tasklen = slots + workers
+        self.donelen = slots + 1
+        self.tasks = _COUNTER.size * 2
+        self.done = self.tasks + self.tasklen * _INDEX.size
+        self.data = self.done + self.donelen * _INDEX.size
+        self.size = self.data + slots * slotsize
+
+    def slot(self, idx: int) -> int:
+        return self.data + idx * self.slotsize
+
+
+def _push_done(buf: memoryview, layout: _Layout, idx: int) -> None:
+    """Put idx on the done ring"""
+    tail, = _COUNTER.unpack_from(buf, _DONETAIL)
+    _INDEX.pack_into(buf, layout.done + (tail % layout.donelen) * _INDEX.size, idx)
+    _COUNTER.pack_into(buf, _DONETAIL, tail + 1)
+
+
+def _worker(shmname: str, layout: _Layout, secret: bytes,
+            values: Optional[Dict[str, Any]], revoked: Optional[str],
+            tasklock: Any, tasksem: Any, donelock: Any, donesem: Any) -> None:
+    revocations = None
+    if revoked is not None:
+        revocations = RevocationSet.load(revoked)
+    master = MasterRune(secret, revocations=revocations)
+    del secret
+
+    shm = shared_memory.SharedMemory(shmname)
+    try:
+        buf = shm.buf
+        assert buf is not None
+        while True:
+            tasksem.acquire()
+            with tasklock:
+                head, = _COUNTER.unpack_from(buf, _TASKHEAD)
+                idx, = _INDEX.unpack_from(buf, layout.tasks + (head % layout.tasklen) * _INDEX.size)
+                _COUNTER.pack_into(buf, _TASKHEAD, head + 1)
+            if idx == _STOP:
+                break
+
+            off = layout.slot(idx)
+            runelen, valueslen = _REQUEST.unpack_from(buf, off)
+            start = off + _REQUEST.size
+            runestr = bytes(buf[start:start + runelen]).decode('utf8')
+            itemvalues = values
+            if valueslen != _NO_VALUES:
+                start += runelen
+                itemvalues = json.loads(bytes(buf[start:start + valueslen]))
+
+            if itemvalues is None:
+                rune, whyfail = master._authorized_rune(runestr)
+                ok = rune is not None
+            else:
+                ok, whyfail = master.check_with_reason(runestr, itemvalues)
+
+            # If it doesn't fit, cut it on a character boundary.
+            reason = whyfail.encode('utf8')
+            if len(reason) > layout.slotsize - _RESPONSE.size:
+                reason = reason[:layout.slotsize - _RESPONSE.size].decode('utf8', errors='ignore').encode('utf8')
+            _RESPONSE.pack_into(buf, off, ok, len(reason))
+            buf[off + _RESPONSE.size:off + _RESPONSE.size + len(reason)] = reason
+
+            with donelock:
+                _push_done(buf, layout, idx)
+            donesem.release()
+        del buf
+    finally:
+        shm.close()
+
+
+class VerifierPool(object):
+    """Worker processes which check runestrings against secret, as
+MasterRune.check_with_reason() does.
+
+Runestrings are tested against values (which must be JSON-able, or at
+least picklable: it's sent to each worker once), or the values passed
+with each one (JSON-able only).  If neither is given, only the
+authcode is checked.  revoked is a RevocationSet snapshot file, which
+each worker maps.
+
+If a worker process dies, the pool is broken: unfinished futures (and
+any later submit()) raise RuntimeError.
+
+Each in-flight runestring (and its values JSON) must fit in a slot of
+slotsize bytes; at most `slots` can be in flight at once, after which
+submit() waits.
+
+    """
+    def __init__(self,
+                 secret: bytes,
+                 processes: Optional[int] = None,
+                 values: Optional[Dict[str, Any]] = None,
+                 revoked: Optional[str] = None,
+                 slots: int = 1024,
+                 slotsize: int = 4096,
+                 context: Optional[Any] = None):
+        if slots <= 0 or slotsize < _REQUEST.size + 1:
+            raise ValueError("VerifierPool needs at least one slot, of at least {} bytes"
+                             .format(_REQUEST.size + 1))
+        if revoked is not None:
+            # Fail now, not in every worker.
+            RevocationSet.load(revoked)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if context is None:
+            context = multiprocessing.get_context()
+        self._layout = _Layout(slots, slotsize, processes)
+        self._shm = shared_memory.SharedMemory(create=True, size=self._layout.size)
+        assert self._shm.buf is not None
+        self._buf: memoryview = self._shm.buf
+
+        self._tasklock = context.Lock()
+        self._tasksem = context.Semaphore(0)
+        self._donelock = context.Lock()
+        self._donesem = context.Semaphore(0)
+
+        # Submitting side: free slots, and where the next task goes.
+        self._lock = threading.Lock()
+        self._free = list(range(slots))
+        self._freesem = threading.Semaphore(slots)
+        self._tasktail = 0
+        self._futures: List[Optional['Future[Tuple[bool, str]]']] = [None] * slots
+        self._closed = False
+        # Set once we expect the workers to exit.
+        self._stopping = False
+        # Why the pool broke, if a worker died.
+        self._error: Optional[Exception] = None
+
+        self._workers = [context.Process(target=_worker, daemon=True,
+                                         args=(self._shm.name, self._layout, secret, values, revoked,
+                                               self._tasklock, self._tasksem,
+                                               self._donelock, self._donesem))
+                         for _ in range(processes)]
+        for w in self._workers:
+            w.start()
+        # Started after forking the workers, so they don't inherit it.
+        self._collector: Optional[threading.Thread] = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        self._watcher: Optional[threading.Thread] = None
+        if self._workers:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def _push_task(self, idx: int) -> None:
+        """Put idx on the task ring (with self._lock held)"""
+        layout = self._layout
+        _INDEX.pack_into(self._buf, layout.tasks + (self._tasktail % layout.tasklen) * _INDEX.size, idx)
+        self._tasktail += 1
+        self._tasksem.release()
+
+    def _collect(self) -> None:
+        """Complete the futures of finished slots (our thread)"""
+        layout = self._layout
+        buf = self._buf
+        donehead = 0
+        while True:
+            self._donesem.acquire()
+            idx, = _INDEX.unpack_from(buf, layout.done + (donehead % layout.donelen) * _INDEX.size)
+            donehead += 1
+            if idx == _STOP:
+                return
+
+            with self._lock:
+                fut = self._futures[idx]
+                if fut is None:
+                    # Already failed (and freed) by _watch().
+                    continue
+                self._futures[idx] = None
+                off = layout.slot(idx)
+                error: Optional[Exception] = None
+                try:
+                    ok, reasonlen = _RESPONSE.unpack_from(buf, off)
+                    start = off + _RESPONSE.size
+                    result = (bool(ok), bytes(buf[start:start + reasonlen]).decode('utf8', errors='replace'))
+                except Exception as e:
+                    # Don't die: everyone else would wait forever.
+                    error = e
+                self._free.append(idx)
+            self._freesem.release()
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    def _watch(self) -> None:
+        """Break the pool if a worker exits when it shouldn't (our thread)"""
+        sentinels = {w.sentinel: w for w in self._workers}
+        done = multiprocessing.connection.wait(list(sentinels))
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = self._closed = True
+            dead = sentinels[done[0]]
+            self._error = RuntimeError("VerifierPool worker exited unexpectedly (exit code {})"
+                                       .format(dead.exitcode))
+        for w in self._workers:
+            w.terminate()
+        for w in self._workers:
+            w.join()
+        self._fail_outstanding(self._error)
+
+    def _fail_outstanding(self, error: Exception) -> None:
+        """Fail every unfinished future and free its slot"""
+        with self._lock:
+            failed = []
+            for idx, fut in enumerate(self._futures):
+                if fut is not None:
+                    failed.append(fut)
+                    self._futures[idx] = None
+                    self._free.append(idx)
+        for fut in failed:
+            self._freesem.release()
+            fut.set_exception(error)
+
+    def submit(self, runestr: str, values: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> 'Future[Tuple[bool, str]]':
+        """Queue runestr to be checked (against values, if given): returns
+a concurrent.futures.Future of (passed, reason).  Waits up to timeout
+seconds (forever, if None) for a free slot, then raises TimeoutError.
+
+        """
+        data = runestr.encode('utf8')
+        valuesdata = b''
+        valueslen = _NO_VALUES
+        if values is not None:
+            valuesdata = json.dumps(values).encode('utf8')
+            valueslen = len(valuesdata)
+        if _REQUEST.size + len(data) + len(valuesdata) > self._layout.slotsize:
+            raise ValueError("runestring and values are too large for a {} byte slot"
+                             .format(self._layout.slotsize))
+        self._check_open()
+        if not self._freesem.acquire(timeout=timeout):
+            raise TimeoutError("no free VerifierPool slot")
+        fut: 'Future[Tuple[bool, str]]' = Future()
+        fut.set_running_or_notify_cancel()
+        with self._lock:
+            # We may have been waiting while it closed (or broke).
+            if self._closed:
+                self._freesem.release()
+                self._check_open()
+            idx = self._free.pop()
+            self._futures[idx] = fut
+            off = self._layout.slot(idx)
+            _REQUEST.pack_into(self._buf, off, len(data), valueslen)
+            start = off + _REQUEST.size
+            self._buf[start:start + len(data)] = data
+            start += len(data)
+            self._buf[start:start + len(valuesdata)] = valuesdata
+            self._push_task(idx)
+        return fut
+
+    def _check_open(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("VerifierPool is broken: {}".format(self._error))
+        if self._closed:
+            raise RuntimeError("VerifierPool is closed")
+
+    def map(self, runestrs: Iterable[str],
+            values_list: Optional[Iterable[Optional[Dict[str, Any]]]] = None) -> Iterator[Tuple[bool, str]]:
+        """Check each runestring (against the corresponding values, if
+        given), yielding (passed, reason) for each in order.  It only
+        reads ahead as far as there are slots."""
+        window: Deque['Future[Tuple[bool, str]]'] = collections.deque()
+        if values_list is None:
+            items: Iterable[Tuple[str, Optional[Dict[str, Any]]]] = ((r, None) for r in runestrs)
+        else:
+            items = zip(runestrs, values_list)
+        for runestr, values in items:
+            if len(window) >= self._layout.slots:
+                yield window.popleft().result()
+            window.append(self.submit(runestr, values))
+        while window:
+            yield window.popleft().result()
+
+    def close(self) -> None:
+        """Finish the work already submitted, stop the workers and free
+        the shared memory"""
+        with self._lock:
+            closed, self._closed = self._closed, True
+        if closed:
+            if self._collector is not None:
+                self.terminate()
+            return
+        # Wait for every slot to come back (or be failed, if a worker
+        # dies meanwhile).
+        for _ in range(self._layout.slots):
+            self._freesem.acquire()
+        with self._lock:
+            if self._error is None:
+                self._stopping = True
+                for _ in self._workers:
+                    self._push_task(_STOP)
+        for w in self._workers:
+            w.join()
+        self._shutdown()
+
+    def terminate(self) -> None:
+        """Stop the workers now: unfinished futures raise RuntimeError"""
+        with self._lock:
+            if self._collector is None:
+                return
+            self._closed = self._stopping = True
+        for w in self._workers:
+            w.terminate()
+        for w in self._workers:
+            w.join()
+        self._shutdown()
+        self._fail_outstanding(RuntimeError("VerifierPool terminated"))
+
+    def _shutdown(self) -> None:
+        """Stop the collector and free the shared memory, once the
+        workers have exited"""
+        # Tell the collector to stop, as a worker would (but they're gone,
+        # so we don't need the lock, which a killed one might hold).
+        _push_done(self._buf, self._layout, _STOP)
+        self._donesem.release()
+        assert self._collector is not None
+        self._collector.join()
+        if self._watcher is not None:
+            self._watcher.join()
+        self._collector = None
+
+        del self._buf
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> 'VerifierPool':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
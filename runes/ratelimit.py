@@ -0,0 +1,204 @@
+"""Rate-limit restrictions, keyed on the rune's unique_id.
+
+A RateLimiter understands these restrictions (only with '='):
+
+    mintime=SECS   at least SECS (may be fractional) seconds between uses
+    per=N[UNIT]    at most one use every N units: nsec, usec, msec, sec
+                   (the default), min, hour or day
+    rate=N         at most N uses per minute (i.e. per=60/N sec)
+
+A use is only recorded if the whole rune passes, and recording it
+re-checks the time atomically, so concurrent checks can't both slip
+through.  Where last-use times are kept is up to the backend:
+MemoryBackend for a single process, SharedMemoryBackend for processes
+forked from the one which created it (e.g. a pre-fork server's
+workers).
+"""
+import hashlib
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .runes import MasterRune, Rune, Alternative, _rune_id
+
+FIELDS = ('mintime', 'per', 'rate')
+
+_PER_UNITS = {'nsec': 1e-9, 'usec': 1e-6, 'msec': 1e-3, 'sec': 1.0,
+              'min': 60.0, 'hour': 3600.0, 'day': 86400.0}
+
+
+def _interval(alt: Alternative) -> Tuple[Optional[float], str]:
+    """The minimum seconds between uses this alternative requires, or None
+    and why it's invalid"""
+    if alt.cond != '=':
+        return None, '{}: only supports ='.format(alt.field)
+    try:
+        if alt.field == 'mintime':
+            secs = float(alt.value)
+        elif alt.field == 'per':
+            num, unit = alt.value, 'sec'
+            for u in _PER_UNITS:
+                if alt.value.endswith(u):
+                    num, unit = alt.value[:-len(u)], u
+                    break
+            secs = int(num) * _PER_UNITS[unit]
+        else:
+            secs = 60.0 / int(alt.value)
+    except (ValueError, ZeroDivisionError):
+        return None, '{}: not a valid {}'.format(alt.field, alt.field)
+    if not secs >= 0:
+        return None, '{}: not a valid {}'.format(alt.field, alt.field)
+    return secs, ''
+
+
+class MemoryBackend(object):
+    """Last-use times in a dict: only for a single process (but thread-safe)"""
+    def __init__(self) -> None:
+        self._last: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def last(self, key: str) -> Optional[float]:
+        """When key was last used, or None"""
+        return self._last.get(key)
+
+    def acquire(self, key: str, now: float, interval: float) -> bool:
+        """If key wasn't used in the interval before now, record a use at
+        now and return True, otherwise False"""
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now < last + interval:
+                return False
+            self._last[key] = now
+            return True
+
+
+# Each slot is a 64-bit hash of the key (0 if empty) and its last use.
+_SLOT = struct.Struct('<Qd')
+
+
+class SharedMemoryBackend(object):
+    """Last-use times in a multiprocessing.shared_memory hash table.
+
+Create it before forking: the children share the table and its locks.
+Each key hashes to a bucket of `slots` entries; when a bucket is full,
+the least recently used entry is replaced, so make sure buckets *
+slots comfortably exceeds the number of ids you rate-limit at once.
+
+Python can't do atomic compare-and-swap on shared memory, so each
+bucket is guarded by one of `locks` striped multiprocessing locks,
+held only to read or update that bucket.
+
+    """
+    def __init__(self, buckets: int = 8192, slots: int = 8, locks: int = 64):
+        self.buckets = buckets
+        self.slots = slots
+        # This starts zeroed, i.e. empty.
+        self.shm = shared_memory.SharedMemory(create=True, size=buckets * slots * _SLOT.size)
+        assert self.shm.buf is not None
+        self._buf: memoryview = self.shm.buf
+        self._locks = [multiprocessing.Lock() for _ in range(locks)]
+
+    def _bucket(self, key: str) -> Tuple[int, int, Any]:
+        """The hash for key, its bucket's offset, and its lock"""
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        bucket = h % self.buckets
+        return h, bucket * self.slots * _SLOT.size, self._locks[bucket % len(self._locks)]
+
+    def last(self, key: str) -> Optional[float]:
+        h, off, lock = self._bucket(key)
+        buf = self._buf
+        with lock:
+            for i in range(self.slots):
+                slothash, last = _SLOT.unpack_from(buf, off + i * _SLOT.size)
+                if slothash == h:
+                    return last
+        return None
+
+    def acquire(self, key: str, now: float, interval: float) -> bool:
+        h, off, lock = self._bucket(key)
+        buf = self._buf
+        with lock:
+            # Our slot if we have one, otherwise the least recently used.
+            victim = off
+            victim_last = None
+            for i in range(self.slots):
+                slotoff = off + i * _SLOT.size
+                slothash, last = _SLOT.unpack_from(buf, slotoff)
+                if slothash == h:
+                    if now < last + interval:
+                        return False
+                    victim = slotoff
+                    break
+                if slothash == 0:
+                    last = float('-inf')
+                if victim_last is None or last < victim_last:
+                    victim, victim_last = slotoff, last
+            _SLOT.pack_into(buf, victim, h, now)
+        return True
+
+    def close(self) -> None:
+        """Detach from the shared memory (in each process)"""
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """Destroy the shared memory (once, when everyone is done)"""
+        self.shm.unlink()
+
+
+class RateLimiter(object):
+    """Enforces mintime, per and rate restrictions, using backend to
+remember when each unique_id was last used.  clock gives the time in
+seconds (time.time by default): it must agree between processes
+sharing a backend.
+
+    """
+    def __init__(self, backend: Optional[Any] = None, clock: Callable[[], float] = time.time):
+        if backend is None:
+            backend = MemoryBackend()
+        self.backend = backend
+        self.clock = clock
+
+    def check(self, rune: Rune, values: Dict[str, Any], now: Optional[float] = None) -> Tuple[bool, str]:
+        """rune.are_restrictions_met(values), also testing any rate
+        restrictions, and recording a use if everything passes"""
+        if now is None:
+            now = self.clock()
+        key = _rune_id(rune)
+        # Rate alternatives which passed: (interval, field)
+        passed: List[Tuple[float, str]] = []
+        lastused: List[Optional[float]] = []
+
+        def ratecheck(alt: Alternative) -> Optional[str]:
+            interval, whyfail = _interval(alt)
+            if interval is None:
+                return whyfail
+            if key == '':
+                return '{}: rune has no unique_id'.format(alt.field)
+            if not lastused:
+                lastused.append(self.backend.last(key))
+            if lastused[0] is not None and now < lastused[0] + interval:
+                return '{}: too soon'.format(alt.field)
+            passed.append((interval, alt.field))
+            return None
+
+        allvalues = dict(values)
+        for field in FIELDS:
+            allvalues[field] = ratecheck
+        ok, whyfail = rune.are_restrictions_met(allvalues)
+        if ok and passed:
+            interval, field = max(passed)
+            # Someone else may have used it since we looked.
+            if not self.backend.acquire(key, now, interval):
+                return False, '{}: too soon'.format(field)
+        return ok, whyfail
+
+    def check_with_reason(self, master: MasterRune, b64str: str, values: Dict[str, Any]) -> Tuple[bool, str]:
+        """master.check_with_reason(b64str, values), enforcing rate
+        restrictions too"""
+        rune, whyfail = master._authorized_rune(b64str)
+        if rune is None:
+            return False, whyfail
+        return self.check(rune, values)
@@ -0,0 +1,193 @@
+"""A compact set of revoked unique_ids, which MasterRune can consult.
+
+Integer ids (the usual case: a persistent counter) are kept as sorted,
+merged ranges, so revoking a million consecutive ids takes two
+integers.  Any other ids are kept in an ordinary set.
+
+A RevocationSet can be saved to a snapshot file, and load() maps that
+file rather than reading it: worker processes loading the same
+snapshot share one copy of the ranges in the page cache, and start
+without parsing anything.
+
+Lookups can run while other threads add ids: adding builds new arrays
+and swaps them in with a single assignment, so a lookup sees the
+ranges either before or after, never halfway.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+# Magic, number of ranges, bytes of JSON for the other ids.  The range
+# starts, then ends (exclusive), follow as little-endian uint64s, then
+# the JSON list.
+_HEADER = struct.Struct('<8sQQ')
+_MAGIC = b'RUNEREV1'
+_MAX_INT_ID = 2**64 - 2
+
+
+def _int_id(unique_id: Union[int, str]) -> Optional[int]:
+    """The id as an int we can put in a range, if it is one"""
+    # bool is an int, but True is not unique_id 1.
+    if isinstance(unique_id, bool) or not isinstance(unique_id, (int, str)):
+        raise TypeError("unique_id must be an int or str, not {}".format(type(unique_id).__name__))
+    if isinstance(unique_id, str):
+        # Only canonical decimal strings, since that's what we compare.
+        if not unique_id.isdecimal() or not unique_id.isascii() or (unique_id[0] == '0' and unique_id != '0'):
+            return None
+        unique_id = int(unique_id)
+    if 0 <= unique_id <= _MAX_INT_ID:
+        return unique_id
+    return None
+
+
+class RevocationSet(object):
+    """A set of revoked unique_ids (ints, or the strings in runes).
+
+Pass one to MasterRune(revocations=...) and it will fail any rune
+whose unique_id is in it with "id: revoked", whatever its version.
+
+    """
+    def __init__(self, ids: Iterable[Union[int, str]] = ()):
+        # Range starts and ends (exclusive): never modified, only
+        # replaced together.
+        self._ranges: Tuple[Sequence[int], Sequence[int]] = (array('Q'), array('Q'))
+        self._others: Set[str] = set()
+        # Set by load(): the mapping our ranges point into.
+        self._mmap: Optional[mmap.mmap] = None
+        # Only one thread changes the ranges at a time.
+        self._lock = threading.Lock()
+        self.update(ids)
+
+    def __contains__(self, unique_id: Union[int, str]) -> bool:
+        n = _int_id(unique_id)
+        if n is None:
+            return str(unique_id) in self._others
+        starts, ends = self._ranges
+        i = bisect.bisect_right(starts, n) - 1
+        return i >= 0 and n < ends[i]
+
+    def __len__(self) -> int:
+        starts, ends = self._ranges
+        return sum(e - s for s, e in zip(starts, ends)) + len(self._others)
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """The integer ids, as sorted (start, stop) ranges"""
+        starts, ends = self._ranges
+        return list(zip(starts, ends))
+
+    def others(self) -> Set[str]:
+        """The ids which aren't (small, non-negative) integers"""
+        return set(self._others)
+
+    def add(self, unique_id: Union[int, str]) -> None:
+        """Revoke a single id"""
+        n = _int_id(unique_id)
+        if n is None:
+            self._others.add(str(unique_id))
+        else:
+            self.add_range(n, n + 1)
+
+    def add_range(self, start: int, stop: int) -> None:
+        """Revoke the ids start, start+1, ... stop-1"""
+        if start < 0 or stop > _MAX_INT_ID + 1:
+            raise ValueError("add_range only handles ids from 0 to {}".format(_MAX_INT_ID))
+        if start >= stop:
+            return
+        with self._lock:
+            # Copies, which also takes them out of a loaded snapshot.
+            starts, ends = (array('Q', r) for r in self._ranges)
+            # Merge with every range which overlaps or touches this one.
+            lo = bisect.bisect_left(ends, start)
+            hi = bisect.bisect_right(starts, stop)
+            if lo < hi:
+                start = min(start, starts[lo])
+                stop = max(stop, ends[hi - 1])
+            starts[lo:hi] = array('Q', [start])
+            ends[lo:hi] = array('Q', [stop])
+            self._ranges, self._mmap = (starts, ends), None
+
+    def update(self, ids: Iterable[Union[int, str]]) -> None:
+        """Revoke many ids: faster than add() for each"""
+        ints = []
+        for unique_id in ids:
+            n = _int_id(unique_id)
+            if n is None:
+                self._others.add(str(unique_id))
+            else:
+                ints.append(n)
+        if not ints:
+            return
+
+        ints.sort()
+        new = []
+        start = stop = ints[0]
+        for n in ints:
+            if n > stop:
+                new.append((start, stop))
+                start = n
+            stop = n + 1
+        new.append((start, stop))
+
+        with self._lock:
+            # Merge the two sorted lists of ranges.
+            starts: Any = array('Q')
+            ends: Any = array('Q')
+            for s, e in sorted(self.ranges() + new):
+                if ends and s <= ends[-1]:
+                    ends[-1] = max(ends[-1], e)
+                else:
+                    starts.append(s)
+                    ends.append(e)
+            self._ranges, self._mmap = (starts, ends), None
+
+    def save(self, path: str) -> None:
+        """Write a snapshot for load().  This replaces path atomically,
+        so processes loading it never see a partial file."""
+        others = json.dumps(sorted(self._others)).encode('utf8')
+        starts, ends = (array('Q', r) for r in self._ranges)
+        if sys.byteorder != 'little':
+            starts.byteswap()
+            ends.byteswap()
+
+        tmppath = '{}.tmp{}'.format(path, os.getpid())
+        with open(tmppath, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(starts), len(others)))
+            f.write(starts.tobytes())
+            f.write(ends.tobytes())
+            f.write(others)
+        os.replace(tmppath, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RevocationSet':
+        """Map a snapshot written by save().  Adding to the result copies
+        the ranges into private memory first."""
+        ret = cls()
+        with open(path, 'rb') as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("{} is not a revocation snapshot".format(path))
+        if len(mm) < _HEADER.size:
+            raise ValueError("{} is not a revocation snapshot".format(path))
+        magic, nranges, otherlen = _HEADER.unpack_from(mm)
+        end = _HEADER.size + nranges * 16 + otherlen
+        if magic != _MAGIC or len(mm) != end:
+            raise ValueError("{} is not a revocation snapshot".format(path))
+
+        mv = memoryview(mm)
+        rangebytes = mv[_HEADER.size:_HEADER.size + nranges * 16]
+        if sys.byteorder == 'little':
+            ret._ranges = (rangebytes[:nranges * 8].cast('Q'), rangebytes[nranges * 8:].cast('Q'))
+            ret._mmap = mm
+        else:
+            ranges = array('Q', rangebytes.tobytes())
+            ranges.byteswap()
+            ret._ranges = (ranges[:nranges], ranges[nranges:])
+        ret._others = set(json.loads(bytes(mv[end - otherlen:end]).decode('utf8')))
+        return ret
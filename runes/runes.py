@@ -1,11 +1,20 @@
 import base64
 import copy
 import hashlib
+import marshal
+import operator
+import os
 import re
-# We can't use the hashlib one, since we need midstate access :(
-import sha256  # type: ignore
 import string
-from typing import Dict, List, Sequence, Optional, Tuple, Any, Union
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Awaitable
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+# We can't use the hashlib one, since we need midstate access :(
+from .midstate import sha256
+from .revocation import RevocationSet
 
 
 def padlen_64(x: int):
@@ -19,8 +28,83 @@ def end_shastream(length: int):
     return bytes([0x80]) + bytes(padlen) + int.to_bytes(length * 8, 8, 'big')
 
 
+# An alternative is a field up to the first punctuation (which is the
+# condition), then a value up to the first unescaped '|' or '&'.  We
+# swallow a trailing '|', but leave '&' for the Restriction.
+_ALTERNATIVE_RE = re.compile(r'([^{punct}]*)([{punct}])((?:[^\\|&]|\\.)*)\|?'
+                             .format(punct=re.escape(string.punctuation)),
+                             re.DOTALL)
+_UNESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+# Faster than a r'\1' template for _UNESCAPE_RE.sub()
+_unescaped = operator.itemgetter(1)
+
+
+# Bumped whenever an Alternative changes, so a Restriction knows its
+# cached encoding may be stale.
+_alternative_changes = 0
+
+
+def _decode_restrictions(encstr: str, off: int = 0) -> List['Restriction']:
+    """Decode all the '&'-separated restrictions in encstr from off onwards,
+    in a single pass"""
+    restrictions: List[Restriction] = []
+    while off < len(encstr):
+        # ID field is only valid at front!
+        restr, off = Restriction._decode_at(encstr, off,
+                                            allow_idfield=(restrictions == []))
+        restrictions.append(restr)
+    return restrictions
+
+
+def _always_passes(values: Dict[str, Any]) -> Optional[str]:
+    return None
+
+
+def _never_passes(val: str) -> bool:
+    return False
+
+
+def _rune_id(rune: 'Rune') -> str:
+    """The unique_id of the rune, without any version ('' if none)"""
+    if rune.restrictions:
+        alt = rune.restrictions[0].alternatives[0]
+        if alt.is_unique_id():
+            return alt.value.split('-', 1)[0]
+    return ''
+
+
+# Version of Rune.to_snapshot() format
+_SNAPSHOT_VERSION = 1
+
+
+def _restore_rune(cls: type, authcode: bytes, length: int, restrictions: List['Restriction']) -> 'Rune':
+    """For unpickling Runes"""
+    return cls._from_state(authcode, length, restrictions)  # type: ignore
+
+
+def _discard(aw: Any) -> None:
+    """Clean up an awaitable we aren't going to await"""
+    if hasattr(aw, 'cancel'):
+        aw.cancel()
+    elif hasattr(aw, 'close'):
+        # A coroutine: this stops the "never awaited" warning.
+        aw.close()
+
+
+def _int_bound(cond: str, value: str) -> Optional[int]:
+    """The integer a '<' or '>' compares against (None if it isn't one)"""
+    if cond not in ('<', '>'):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
 class Alternative(object):
     """One of possibly several conditions which could be met"""
+    __slots__ = ('_field', '_cond', '_value', '_bound', '_encbytes')
+
     def __init__(self, field: str, cond: str, value: str, allow_idfield: bool = False):
         if any([c in string.punctuation for c in field]):
             raise ValueError("field not valid")
@@ -31,132 +115,309 @@ class Alternative(object):
                 raise ValueError("unique_id field not valid here")
             if cond != '=':
                 raise ValueError("unique_id condition must be '='")
-        self.field = field
-        self.value = value
-        self.cond = cond
+        # Parsed runes keep getting the same field names: share them.
+        self._field = sys.intern(field)
+        self._value = value
+        self._cond = cond
+        # Parsed once here, not on every test.
+        self._bound = _int_bound(cond, value) if cond in ('<', '>') else None
+        # Our encoding, in UTF-8 (which is what gets hashed).
+        self._encbytes: Optional[bytes] = None
+
+    # copy, deepcopy and pickle only need the fields; the rest is
+    # rebuilt from them.
+    def __getstate__(self) -> Tuple[str, str, str]:
+        return self._field, self._cond, self._value
+
+    def __setstate__(self, state: Tuple[str, str, str]) -> None:
+        field, self._cond, self._value = state
+        self._field = sys.intern(field)
+        self._bound = _int_bound(self._cond, self._value)
+        self._encbytes = None
+
+    # Changing field, cond or value invalidates our bound and encoding.
+    @property
+    def field(self) -> str:
+        return self._field
+
+    @field.setter
+    def field(self, field: str) -> None:
+        self._field = sys.intern(field)
+        self._changed()
+
+    @property
+    def cond(self) -> str:
+        return self._cond
+
+    @cond.setter
+    def cond(self, cond: str) -> None:
+        self._cond = cond
+        self._bound = _int_bound(cond, self._value)
+        self._changed()
+
+    @property
+    def value(self) -> str:
+        return self._value
+
+    @value.setter
+    def value(self, value: str) -> None:
+        self._value = value
+        self._bound = _int_bound(self._cond, value)
+        self._changed()
+
+    def _changed(self) -> None:
+        global _alternative_changes
+        self._encbytes = None
+        _alternative_changes += 1
 
     def is_unique_id(self) -> bool:
-        return self.field == ''
+        return self._field == ''
 
     def test(self, values: Dict[str, Any]) -> Optional[str]:
         """Returns None on success, otherwise an explanation string"""
         # This is always True
-        if self.cond == '#':
+        if self._cond == '#':
+            return None
+        field = self._field
+        if field not in values:
+            return self._missing()
+        val = values[field]
+        # If they supply a function, hand it to them.
+        if callable(val):
+            return val(self)
+        if self._passes(val):
+            return None
+        return '{}: {}'.format(field, self._explain(str(val)))
+
+    def is_met(self, values: Dict[str, Any]) -> bool:
+        """Same as self.test(values) is None, but never formats a reason"""
+        return self._check(values) is None
+
+    def _check(self, values: Dict[str, Any]) -> Union[None, str, 'Alternative']:
+        """Like test(), but only returns a reason if it didn't have to
+        format one (the field is missing, or a callable returned it):
+        otherwise it returns this Alternative on failure"""
+        if self._cond == '#':
+            return None
+        field = self._field
+        if field not in values:
+            return self._missing()
+        val = values[field]
+        if callable(val):
+            return val(self)
+        if self._passes(val):
             return None
+        return self
 
-        def why(cond, field, explanation) -> Optional[str]:
-            if cond:
+    def compile(self) -> Callable[[Dict[str, Any]], Optional[str]]:
+        """Returns a function equivalent to self.test(), with everything
+        which doesn't depend on the values worked out in advance"""
+        # This is always True
+        if self.cond == '#':
+            return _always_passes
+
+        field = self.field
+        missing, passes, explain = self._matcher()
+        alt = self
+
+        if self.cond in ('<', '>'):
+            bound = self._bound
+            compare = operator.lt if self.cond == '<' else operator.gt
+
+            def test_int(values: Dict[str, Any]) -> Optional[str]:
+                if field not in values:
+                    return missing
+                val = values[field]
+                # Compare ints directly, rather than via str().  Not bools:
+                # their str() isn't an integer.
+                if type(val) is int:
+                    if bound is not None and compare(val, bound):
+                        return None
+                    return '{}: {}'.format(field, explain(str(val)))
+                if callable(val):
+                    return val(alt)
+                val = str(val)
+                if passes(val):
+                    return None
+                return '{}: {}'.format(field, explain(val))
+
+            return test_int
+
+        def test(values: Dict[str, Any]) -> Optional[str]:
+            if field not in values:
+                return missing
+            val = values[field]
+            # If they supply a function, hand it to them.
+            if callable(val):
+                return val(alt)
+            val = str(val)
+            if passes(val):
                 return None
-            return '{}: {}'.format(field, explanation)
+            return '{}: {}'.format(field, explain(val))
+
+        return test
 
-        # If it's missing, it's only True if it's a missing test.
-        if self.field not in values:
+    def _missing(self) -> Optional[str]:
+        """The reason if the field is missing (None if that passes)"""
+        # It's only True if it's a missing test.
+        if self.is_unique_id():
             # Default to ignoring id field as long as no version.
-            if self.is_unique_id():
-                return why('-' not in self.value, 'id', 'unknown version {}'.format(self.value))
-            return why(self.cond == '!', self.field, 'is missing')
+            if '-' in self._value:
+                return 'id: unknown version {}'.format(self._value)
+            return None
+        if self._cond == '!':
+            return None
+        return '{}: is missing'.format(self._field)
+
+    def _passes(self, val: Any) -> bool:
+        """Whether this (non-callable) value passes.  Not for '#'."""
+        cond = self._cond
+        if cond in ('<', '>'):
+            # Compare ints directly, rather than via str().  Not bools:
+            # their str() isn't an integer.
+            if type(val) is not int:
+                try:
+                    val = int(str(val))
+                except ValueError:
+                    return False
+            bound = self._bound
+            if bound is None:
+                return False
+            return val < bound if cond == '<' else val > bound
+
+        val = str(val)
+        value = self._value
+        if cond == '=':
+            return val == value
+        elif cond == '/':
+            return val != value
+        elif cond == '^':
+            return val.startswith(value)
+        elif cond == '$':
+            return val.endswith(value)
+        elif cond == '~':
+            return value in val
+        elif cond == '{':
+            return val < value
+        elif cond == '}':
+            return val > value
+        # '!': it's present.
+        return False
+
+    def _explain(self, val: str) -> str:
+        """Why the str of a value didn't pass (after the 'field: ')"""
+        cond, value = self._cond, self._value
+        if cond == '!':
+            return 'is present'
+        elif cond == '=':
+            return '!= {}'.format(value)
+        elif cond == '/':
+            return '= {}'.format(value)
+        elif cond == '^':
+            return 'does not start with {}'.format(value)
+        elif cond == '$':
+            return 'does not end with {}'.format(value)
+        elif cond == '~':
+            return 'does not contain {}'.format(value)
+        elif cond in ('<', '>'):
+            try:
+                int(val)
+            except ValueError:
+                return "not an integer field"
+            if self._bound is None:
+                return "not a valid integer"
+            return "{} {}".format('>=' if cond == '<' else '<=', self._bound)
+        elif cond == '{':
+            return 'is the same or ordered after {}'.format(value)
+        elif cond == '}':
+            return 'is the same or ordered before {}'.format(value)
+        else:
+            # We checked this in init!
+            assert False
 
-        # If they supply a function, hand it to them.
-        if callable(values[self.field]):
-            return values[self.field](self)
+    def _matcher(self) -> Tuple[Optional[str], Callable[[str], bool], Callable[[str], str]]:
+        """For compile(): returns the reason if the field is missing (None
+        if that passes), a function which says whether the str of a value
+        passes, and one which explains why it didn't.  Not for '#'."""
+        value = self.value
 
-        val = str(values[self.field])
+        # passes() takes the str of the value, explain() only gets called
+        # if that fails.
+        passes: Callable[[str], bool]
         if self.cond == '!':
-            return why(False, self.field, 'is present')
+            passes = _never_passes
         elif self.cond == '=':
-            return why(val == self.value,
-                       self.field,
-                       '!= {}'.format(self.value))
+            passes = value.__eq__
         elif self.cond == '/':
-            return why(val != self.value,
-                       self.field,
-                       '= {}'.format(self.value))
+            passes = value.__ne__
         elif self.cond == '^':
-            return why(val.startswith(self.value),
-                       self.field,
-                       'does not start with {}'.format(self.value))
+            passes = operator.methodcaller('startswith', value)
         elif self.cond == '$':
-            return why(val.endswith(self.value),
-                       self.field,
-                       'does not end with {}'.format(self.value))
+            passes = operator.methodcaller('endswith', value)
         elif self.cond == '~':
-            return why(self.value in val,
-                       self.field,
-                       'does not contain {}'.format(self.value))
-        elif self.cond == '<':
-            try:
-                actual_int = int(val)
-            except ValueError:
-                return why(False, self.field, "not an integer field")
-            try:
-                restriction_val = int(self.value)
-            except ValueError:
-                return why(False, self.field, "not a valid integer")
-            return why(actual_int < restriction_val,
-                       self.field,
-                       ">= {}".format(restriction_val))
-        elif self.cond == '>':
-            try:
-                actual_int = int(val)
-            except ValueError:
-                return why(False, self.field, "not an integer field")
-            try:
-                restriction_val = int(self.value)
-            except ValueError:
-                return why(False, self.field, "not a valid integer")
-            return why(actual_int > restriction_val,
-                       self.field,
-                       "<= {}".format(restriction_val))
+            passes = lambda val: value in val
+        elif self.cond in ('<', '>'):
+            bound = self._bound
+            compare = operator.lt if self.cond == '<' else operator.gt
+
+            def passes(val: str) -> bool:
+                try:
+                    actual_int = int(val)
+                except ValueError:
+                    return False
+                return bound is not None and compare(actual_int, bound)
         elif self.cond == '{':
-            return why(val < self.value,
-                       self.field,
-                       'is the same or ordered after {}'.format(self.value))
+            passes = value.__gt__
         elif self.cond == '}':
-            return why(val > self.value,
-                       self.field,
-                       'is the same or ordered before {}'.format(self.value))
+            passes = value.__lt__
         else:
             # We checked this in init!
             assert False
 
+        return self._missing(), passes, self._explain
+
     def encode(self) -> str:
-        return self.field + self.cond + (self.value
-                                         .replace('\\', '\\\\')
-                                         .replace('|', '\\|')
-                                         .replace('&', '\\&'))
+        return str(self._encode_bytes(), 'utf8')
+
+    def _encode_bytes(self) -> bytes:
+        """self.encode() in UTF-8, which is what gets hashed"""
+        if self._encbytes is None:
+            self._encbytes = (self._field + self._cond + (self._value
+                                                          .replace('\\', '\\\\')
+                                                          .replace('|', '\\|')
+                                                          .replace('&', '\\&'))).encode()
+        return self._encbytes
 
     @classmethod
     def decode(cls, encstr: str, allow_idfield: bool = False) -> Tuple['Alternative', str]:
         """Pull an Alternative from encoded string, return remainder"""
-        cond = None
-        end_off = 0
+        alt, end_off = cls._decode_at(encstr, 0, allow_idfield)
+        return alt, encstr[end_off:]
 
-        # Swallow field up to conditiona
-        while end_off < len(encstr):
-            if encstr[end_off] in string.punctuation:
-                cond = encstr[end_off]
-                break
-            end_off += 1
-        if cond is None:
+    @classmethod
+    def _decode_at(cls, encstr: str, off: int, allow_idfield: bool = False) -> Tuple['Alternative', int]:
+        """Pull an Alternative from encstr starting at off, return it and the
+        offset where we stopped (after any '|', but before any '&')"""
+        m = _ALTERNATIVE_RE.match(encstr, off)
+        if m is None:
             raise ValueError('{} does not contain any operator'
-                             .format(encstr))
-        field = encstr[:end_off]
-        end_off += 1
-
-        value = ''
-        while end_off < len(encstr):
-            if encstr[end_off] == '|':
-                # We swallow this
-                end_off += 1
-                break
-            if encstr[end_off] == '&':
-                break
-            if encstr[end_off] == '\\':
-                end_off += 1
-            value += encstr[end_off]
-            end_off += 1
+                             .format(encstr[off:]))
+        field, cond, value = m.groups()
+        end_off = m.end()
+        # Only possible at the very end, otherwise it would escape something.
+        if m.end(3) < len(encstr) and encstr[m.end(3)] == '\\':
+            raise ValueError('{} ends with an incomplete escape'
+                             .format(encstr[off:]))
+        if '\\' in value:
+            value = _UNESCAPE_RE.sub(_unescaped, value)
+            encoded = None
+        else:
+            # Without escapes, what we parsed is exactly what we'd encode.
+            encoded = encstr[off:m.end(3)].encode()
 
-        return cls(field, cond, value, allow_idfield), encstr[end_off:]
+        alt = cls(field, cond, value, allow_idfield)
+        alt._encbytes = encoded
+        return alt, end_off
 
     @classmethod
     def from_str(cls, encstr: str) -> 'Alternative':
@@ -174,15 +435,33 @@ class Alternative(object):
 class Restriction(object):
     """A restriction is a set of alternatives: any of those pass, the
 restriction is met"""
+    __slots__ = ('_alternatives', '_encbytes', '_encchanges')
+
     def __init__(self, alternatives: Sequence[Alternative]):
         if alternatives == []:
             raise ValueError("Restriction must have some alternatives")
         self.alternatives = alternatives
 
+    # Replacing the alternatives, or changing any Alternative, invalidates
+    # our encoding (with several alternatives; with one, we use its).
+    # Replace the list, rather than changing it in place.
+    @property
+    def alternatives(self) -> Sequence[Alternative]:
+        return self._alternatives
+
+    @alternatives.setter
+    def alternatives(self, alternatives: Sequence[Alternative]) -> None:
+        self._alternatives = alternatives
+        self._encbytes: Optional[bytes] = None
+        self._encchanges = _alternative_changes
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return Restriction, (self._alternatives,)
+
     def test(self, values: Dict[str, Any]) -> Optional[str]:
         """Returns None on success, otherwise a string of all the failures"""
         reasons = []
-        for alt in self.alternatives:
+        for alt in self._alternatives:
             reason = alt.test(values)
             if reason is None:
                 return None
@@ -190,18 +469,111 @@ restriction is met"""
 
         return " AND ".join(reasons)
 
+    def is_met(self, values: Dict[str, Any]) -> bool:
+        """Same as self.test(values) is None, but never formats a reason"""
+        for alt in self._alternatives:
+            if alt.is_met(values):
+                return True
+        return False
+
+    def failure(self, values: Dict[str, Any]) -> Optional['Reason']:
+        """Returns None on success, otherwise a Reason, which only formats
+        the string self.test() would return when you ask for it"""
+        parts: List[Union[str, Tuple[Alternative, Any]]] = []
+        for alt in self._alternatives:
+            reason = alt._check(values)
+            if reason is None:
+                return None
+            if isinstance(reason, Alternative):
+                # Keep the value (not a callable!) to explain later.
+                parts.append((alt, values[alt.field]))
+            else:
+                parts.append(reason)
+        return Reason(parts)
+
+    async def test_async(self, values: Dict[str, Any]) -> Optional[str]:
+        """Same as self.test(), but callables in values may return
+        awaitables (e.g. be coroutine functions), which we await.
+
+        The awaitables of all the alternatives run concurrently, so
+        (unlike test()) callables for later alternatives are called
+        even if an earlier one would pass.  As soon as any alternative
+        passes, the rest are cancelled."""
+        reasons: List[Any] = []
+        pending: List[Tuple[int, Any]] = []
+        for alt in self._alternatives:
+            reason = alt.test(values)
+            if reason is None:
+                for _, aw in pending:
+                    _discard(aw)
+                return None
+            if isinstance(reason, Awaitable):
+                pending.append((len(reasons), reason))
+            reasons.append(reason)
+
+        if pending:
+            import asyncio
+            tasks = {asyncio.ensure_future(aw): i for i, aw in pending}
+            try:
+                waiting = set(tasks)
+                while waiting:
+                    done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        result = task.result()
+                        if result is None:
+                            return None
+                        reasons[tasks[task]] = result
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return " AND ".join(reasons)
+
+    def compile(self) -> Callable[[Dict[str, Any]], Optional[str]]:
+        """Returns a function equivalent to self.test()"""
+        tests = [alt.compile() for alt in self._alternatives]
+        if len(tests) == 1:
+            return tests[0]
+
+        def test(values: Dict[str, Any]) -> Optional[str]:
+            reasons = []
+            for t in tests:
+                reason = t(values)
+                if reason is None:
+                    return None
+                reasons.append(reason)
+            return " AND ".join(reasons)
+
+        return test
+
     def encode(self) -> str:
-        return '|'.join([alt.encode() for alt in self.alternatives])
+        return str(self._encode_bytes(), 'utf8')
+
+    def _encode_bytes(self) -> bytes:
+        """self.encode() in UTF-8, which is what gets hashed"""
+        alts = self._alternatives
+        if len(alts) == 1:
+            return alts[0]._encode_bytes()
+        if self._encbytes is None or self._encchanges != _alternative_changes:
+            self._encchanges = _alternative_changes
+            self._encbytes = b'|'.join([alt._encode_bytes() for alt in alts])
+        return self._encbytes
 
     @classmethod
     def decode(cls, encstr: str, allow_idfield: bool = False) -> Tuple['Restriction', str]:
         """Pull a Restriction from encoded string, return remainder"""
+        restr, end_off = cls._decode_at(encstr, 0, allow_idfield)
+        return restr, encstr[end_off:]
+
+    @classmethod
+    def _decode_at(cls, encstr: str, off: int, allow_idfield: bool = False) -> Tuple['Restriction', int]:
+        """Pull a Restriction from encstr starting at off, return it and the
+        offset after it (and its trailing '&', if any)"""
         alts = []
-        while len(encstr) != 0:
-            if encstr.startswith('&'):
-                encstr = encstr[1:]
+        while off < len(encstr):
+            if encstr[off] == '&':
+                off += 1
                 break
-            alt, encstr = Alternative.decode(encstr, allow_idfield)
+            alt, off = Alternative._decode_at(encstr, off, allow_idfield)
             alts.append(alt)
             # We never allow id fields after first.
             allow_idfield = False
@@ -209,7 +581,7 @@ restriction is met"""
         if len(alts) > 1 and alts[0].is_unique_id():
             raise ValueError("unique_id field cannot have alternatives")
 
-        return cls(alts), encstr
+        return cls(alts), off
 
     @classmethod
     def from_str(cls, encstr: str) -> 'Restriction':
@@ -235,12 +607,14 @@ restriction is met"""
         return cls([Alternative('', '=', idstr, allow_idfield=True)])
 
     def __eq__(self, other) -> bool:
-        return list(self.alternatives) == list(other.alternatives)
+        return list(self._alternatives) == list(other.alternatives)
 
 
 class Rune(object):
     """A Rune, such as you might get from a server.  You can add
 restrictions and it will still be valid"""
+    __slots__ = ('restrictions', 'shaobj')
+
     def __init__(self,
                  authbase: bytes,
                  unique_id: Optional[Union[int, str]] = None,
@@ -252,7 +626,7 @@ restrictions and it will still be valid"""
         self.restrictions: List[Restriction] = []
 
         # Replace with real shastate (aka authcode)
-        self.shaobj = sha256.sha256()
+        self.shaobj = sha256()
         self.shaobj.state = (authbase, 64)
 
         # If they provide a unique_id, it goes first.
@@ -270,19 +644,66 @@ restrictions and it will still be valid"""
         ret = cls(authcode)
         ret.restrictions = list(restrictions)
 
-        # SHA state needs to simply be updated to cover this length.
-        runelength = ret.shaobj.state[1]
+        # SHA state needs to simply be updated to cover this length
+        # (each restriction, plus its end_shastream()).
+        midstate, runelength = ret.shaobj.state
         for r in ret.restrictions:
-            runelength += len(r.encode())
+            # The UTF-8 length, which is what was hashed.
+            runelength += len(r._encode_bytes()) + 1 + 8
             runelength += padlen_64(runelength)
 
-        ret.shaobj.state = (ret.shaobj.state[0], runelength)
+        ret.shaobj.state = (midstate, runelength)
+        return ret
+
+    @classmethod
+    def _from_state(cls, authcode: bytes, length: int, restrictions: List[Restriction]) -> 'Rune':
+        """Constructor when we already know the state, so we don't have to
+        recalculate the length"""
+        ret = cls.__new__(cls)
+        ret.restrictions = restrictions
+        ret.shaobj = sha256()
+        ret.shaobj.state = (authcode, length)
         return ret
 
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Our sha256 doesn't pickle, but its state is all we need.
+        authcode, length = self.shaobj.state
+        return _restore_rune, (self.__class__, authcode, length, self.restrictions)
+
+    def to_snapshot(self) -> bytes:
+        """A compact binary form of this rune, for caching between
+        processes: from_snapshot() doesn't need to parse it or work out
+        its length.  It uses marshal, so only load snapshots made by the
+        same version of Python, and which you made yourself."""
+        authcode, length = self.shaobj.state
+        return marshal.dumps((_SNAPSHOT_VERSION, authcode, length,
+                              [[(alt._field, alt._cond, alt._value) for alt in r.alternatives]
+                               for r in self.restrictions]))
+
+    @classmethod
+    def from_snapshot(cls, snapshot: bytes) -> 'Rune':
+        """The rune to_snapshot() made this from"""
+        try:
+            version, authcode, length, restrs = marshal.loads(snapshot)
+        except (EOFError, ValueError, TypeError):
+            raise ValueError("Not a rune snapshot")
+        if version != _SNAPSHOT_VERSION:
+            raise ValueError("Unknown rune snapshot version {}".format(version))
+
+        restrictions = []
+        for fields in restrs:
+            alts = []
+            for state in fields:
+                alt = Alternative.__new__(Alternative)
+                alt.__setstate__(state)
+                alts.append(alt)
+            restrictions.append(Restriction(alts))
+        return cls._from_state(authcode, length, restrictions)
+
     def add_restriction(self, restriction: Restriction) -> None:
         self.restrictions.append(restriction)
-        self.shaobj.update(bytes(restriction.encode(), encoding='utf8'))
-        self.shaobj.update(end_shastream(self.shaobj.state[1]))
+        enc = restriction._encode_bytes()
+        self.shaobj.update(enc + end_shastream(self.shaobj.state[1] + len(enc)))
 
     def are_restrictions_met(self, values: Dict[str, Any]) -> Tuple[bool, str]:
         """Tests the restrictions against the values dict given.  Normally
@@ -299,18 +720,67 @@ restrictions and it will still be valid"""
                 return False, reasons
         return True, ''
 
+    async def are_restrictions_met_async(self, values: Dict[str, Any]) -> Tuple[bool, str]:
+        """Same as self.are_restrictions_met(), but callables in values may
+        return awaitables, which we await (see Restriction.test_async()).
+        Restrictions are still tested one at a time, in order."""
+        for r in self.restrictions:
+            reasons = await r.test_async(values)
+            if reasons is not None:
+                return False, reasons
+        return True, ''
+
+    def is_met(self, values: Dict[str, Any]) -> bool:
+        """Same as self.are_restrictions_met(values)[0], but never
+        formats a reason: use this if you don't care why it failed"""
+        for r in self.restrictions:
+            if not r.is_met(values):
+                return False
+        return True
+
+    def failure(self, values: Dict[str, Any]) -> Optional['Reason']:
+        """Returns None if the restrictions are met, otherwise a Reason for
+        the first which isn't.  The reason is only formatted if you
+        str() (or compare) it, so this is cheaper than
+        are_restrictions_met() if you usually discard it."""
+        for r in self.restrictions:
+            reason = r.failure(values)
+            if reason is not None:
+                return reason
+        return None
+
+    def compile(self) -> Callable[[Dict[str, Any]], Tuple[bool, str]]:
+        """Returns a function equivalent to self.are_restrictions_met(),
+        specialized for the current restrictions: use this if you are
+        going to test the same rune many times.  It does not see
+        restrictions added after it was compiled."""
+        tests = [r.compile() for r in self.restrictions]
+
+        def are_restrictions_met(values: Dict[str, Any]) -> Tuple[bool, str]:
+            for t in tests:
+                reason = t(values)
+                if reason is not None:
+                    return False, reason
+            return True, ''
+
+        return are_restrictions_met
+
+    def index(self) -> 'RuneIndex':
+        """Returns a RuneIndex of the current restrictions: like compile(),
+        but it only tests the restrictions on fields you supply."""
+        return RuneIndex(self.restrictions)
+
     def authcode(self) -> bytes:
         return self.shaobj.state[0]
 
     def to_str(self) -> str:
         return (self.authcode().hex()
                 + ':'
-                + '&'.join([r.encode() for r in self.restrictions]))
+                + str(b'&'.join([r._encode_bytes() for r in self.restrictions]), 'utf8'))
 
     def to_base64(self) -> str:
-        restrstr = '&'.join([r.encode() for r in self.restrictions])
-        binstr = base64.urlsafe_b64encode(self.authcode()
-                                          + bytes(restrstr, encoding='utf8'))
+        restrstr = b'&'.join([r._encode_bytes() for r in self.restrictions])
+        binstr = base64.urlsafe_b64encode(self.authcode() + restrstr)
         return binstr.decode('utf8')
 
     @classmethod
@@ -318,21 +788,29 @@ restrictions and it will still be valid"""
         if len(rstr) < 64 or rstr[64] != ':':
             raise ValueError("Rune strings must start with 64 hex digits then '-'")
         authcode = bytes.fromhex(rstr[:64])
-        restrictions: List[Restriction] = []
-        restrictstr = rstr[65:]
+        return cls.from_authcode(authcode, _decode_restrictions(rstr, 65))
 
-        while len(restrictstr) != 0:
-            # ID field is only valid at front!
-            allow_idfield = (restrictions == [])
-            restr, restrictstr = Restriction.decode(restrictstr,
-                                                    allow_idfield=allow_idfield)
-            restrictions.append(restr)
-        return cls.from_authcode(authcode, restrictions)
+    @classmethod
+    def from_bytes(cls, buf: Union[bytes, bytearray, memoryview]) -> 'Rune':
+        """Decode a binary rune (the base64-decoded form: 32 bytes of
+        authcode, then the UTF-8 restrictions)"""
+        if len(buf) < 32:
+            raise ValueError("Rune must start with a 32 byte authcode")
+        return cls.from_authcode(bytes(buf[:32]),
+                                 _decode_restrictions(str(buf[32:], 'utf8')))
 
     @classmethod
-    def from_base64(cls, b64str: str) -> 'Rune':
-        binstr = base64.urlsafe_b64decode(b64str)
-        return cls.from_str(binstr[:32].hex() + ':' + binstr[32:].decode('utf8'))
+    def from_base64(cls, b64str: Union[str, bytes, bytearray, memoryview]) -> 'Rune':
+        """The runestring may also be bytes (or a memoryview), e.g.
+        straight from an HTTP header"""
+        buf = base64.urlsafe_b64decode(b64str)
+        if len(buf) < 32:
+            # What this has always said (when it went through from_str()).
+            raise ValueError("Rune strings must start with 64 hex digits then '-'")
+        return cls.from_bytes(buf)
+
+    # The same: from_base64() takes bytes too.
+    from_base64_bytes = from_base64
 
     def __eq__(self, other) -> bool:
         return (self.restrictions == other.restrictions
@@ -343,12 +821,213 @@ restrictions and it will still be valid"""
         return self.__copy__()
 
     def __copy__(self) -> 'Rune':
-        # You don't want to share the shaobj!
-        return self.from_authcode(self.shaobj.state[0], self.restrictions)
+        # You don't want to share the shaobj!  We know the state, so
+        # this doesn't need to encode the restrictions.
+        authcode, length = self.shaobj.state
+        return self._from_state(authcode, length, list(self.restrictions))
 
     def __deepcopy__(self, memo=None) -> 'Rune':
-        """sha256.sha256 doesn't implement pickle"""
-        return self.from_authcode(self.shaobj.state[0], copy.deepcopy(self.restrictions))
+        """Our sha256 doesn't implement pickle"""
+        authcode, length = self.shaobj.state
+        return self._from_state(authcode, length, copy.deepcopy(self.restrictions))
+
+    def derive(self, *restrictions: Restriction) -> 'Rune':
+        """A new Rune with these restrictions added to ours, as copy()
+        then add_restriction() for each would give: only the new
+        restrictions are encoded and hashed.  From a MasterRune, this
+        gives a plain Rune, ready to hand out."""
+        authcode, length = self.shaobj.state
+        ret = Rune._from_state(authcode, length, list(self.restrictions))
+        for r in restrictions:
+            ret.add_restriction(r)
+        return ret
+
+
+class Reason(object):
+    """Why a Restriction failed, formatted when first needed: str() gives
+the same string Restriction.test() would, and it compares equal to it.
+
+It holds the values which failed (or the reasons callables returned,
+since they must not be called twice), not the whole values dict.
+
+    """
+    __slots__ = ('_parts', '_str')
+
+    def __init__(self, parts: List[Union[str, Tuple[Alternative, Any]]]):
+        self._parts = parts
+        self._str: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self._str is None:
+            reasons = []
+            for part in self._parts:
+                if isinstance(part, str):
+                    reasons.append(part)
+                else:
+                    alt, val = part
+                    reasons.append(str(alt.test({alt.field: val})))
+            self._str = " AND ".join(reasons)
+        return self._str
+
+    def __repr__(self) -> str:
+        return 'Reason({!r})'.format(str(self))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Reason):
+            return str(self) == str(other)
+        return str(self) == other
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+
+class RuneIndex(object):
+    """Evaluates a sequence of restrictions, indexed by field name.
+
+Restrictions on fields which aren't in the values have the same
+outcome every time (a '!' alternative passes, anything else fails), so
+we work that out in advance.  Then are_restrictions_met() only has to
+test the restrictions on fields which are present, which is much
+faster for runes with many restrictions on fields most requests don't
+have.  It gives the same result as Rune.are_restrictions_met(),
+including reporting the first restriction which fails.
+
+Like Rune.compile(), this does not see restrictions added later.
+
+    """
+    __slots__ = ('fields', 'tests', 'missing')
+
+    def __init__(self, restrictions: Sequence[Restriction]):
+        # Field name -> indices of the restrictions which mention it.
+        self.fields: Dict[str, List[int]] = {}
+        self.tests: List[Callable[[Dict[str, Any]], Optional[str]]] = []
+        # Indices of restrictions which fail if none of their fields are
+        # present, and why.
+        self.missing: List[Tuple[int, str]] = []
+        for i, r in enumerate(restrictions):
+            test = r.compile()
+            self.tests.append(test)
+            for field in {alt.field for alt in r.alternatives}:
+                self.fields.setdefault(field, []).append(i)
+            reason = test({})
+            if reason is not None:
+                self.missing.append((i, reason))
+
+    def are_restrictions_met(self, values: Dict[str, Any]) -> Tuple[bool, str]:
+        """Same as Rune.are_restrictions_met()"""
+        fields = self.fields
+        touched = set()
+        if len(values) < len(fields):
+            for field in values:
+                idxs = fields.get(field)
+                if idxs is not None:
+                    touched.update(idxs)
+        else:
+            for field, idxs in fields.items():
+                if field in values:
+                    touched.update(idxs)
+
+        # The first restriction which fails because none of its fields
+        # are present: we only need to test the present ones before it.
+        first_missing = None
+        for i, whyfail in self.missing:
+            if i not in touched:
+                first_missing = (i, whyfail)
+                break
+
+        tests = self.tests
+        for i in sorted(touched):
+            if first_missing is not None and i > first_missing[0]:
+                break
+            reason = tests[i](values)
+            if reason is not None:
+                return False, reason
+
+        if first_missing is not None:
+            return False, first_missing[1]
+        return True, ''
+
+
+class RuneCache(object):
+    """A bounded LRU cache mapping runestrings to Runes which have already
+been parsed and authorized, so they only need their restrictions
+tested.  Entries expire after ttl seconds, if ttl is set.  It's
+thread-safe.
+
+    """
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        if maxsize <= 0:
+            raise ValueError("RuneCache maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Tuple[Rune, Optional[float]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, runestr: str) -> Optional[Rune]:
+        """Returns the cached Rune, or None"""
+        with self._lock:
+            entry = self._entries.get(runestr)
+            if entry is None:
+                self.misses += 1
+                return None
+            rune, expiry = entry
+            if expiry is not None and time.monotonic() >= expiry:
+                del self._entries[runestr]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(runestr)
+            self.hits += 1
+            return rune
+
+    def put(self, runestr: str, rune: Rune) -> None:
+        """Remember this (authorized!) rune, evicting the oldest if full"""
+        expiry = None
+        if self.ttl is not None:
+            expiry = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[runestr] = (rune, expiry)
+            self._entries.move_to_end(runestr)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _PrefixNode(object):
+    """The hash state after a particular sequence of restrictions: authcode
+is what a rune ending here must have, sha has also hashed the
+following pad, ready for the next restriction"""
+    __slots__ = ('authcode', 'sha', 'length', 'children')
+
+    def __init__(self, authcode: bytes, sha: Any, length: int):
+        self.authcode = authcode
+        self.sha = sha
+        self.length = length
+        self.children: Dict[bytes, '_PrefixNode'] = {}
+
+    def child(self, enc: bytes) -> '_PrefixNode':
+        """Find or create the node for this encoded restriction after us"""
+        node = self.children.get(enc)
+        if node is None:
+            sha = self.sha.copy()
+            sha.update(enc)
+            length = self.length + len(enc)
+            authcode = sha.digest()
+            pad = end_shastream(length)
+            sha.update(pad)
+            node = _PrefixNode(authcode, sha, length + len(pad))
+            self.children[enc] = node
+        return node
 
 
 class MasterRune(Rune):
@@ -356,12 +1035,36 @@ class MasterRune(Rune):
 give each rune a unique id (often a persistent counter) (with an
 optional version), which gets included as an empty-fieldname field.
 
+If cache_size is non-zero, check_with_reason() remembers up to that
+many runestrings which it has already parsed and authorized (for
+cache_ttl seconds, if set).  The cache belongs to this MasterRune,
+hence to this secret: copies start with their own, empty cache.
+
+If revocations (a RevocationSet) is set, runes whose unique_id is in
+it fail check_with_reason() and friends with "id: revoked".  Copies
+share it, and it's consulted on every check, so you can add to it as
+you go.
+
+is_rune_authorized() starts from the precomputed hash state for the
+longest known prefix of the rune's restrictions: this MasterRune's
+own restrictions, plus any added with add_prefix().
+
+Checking runes (is_rune_authorized(), check_with_reason() and friends,
+check_many_parallel()) is thread-safe: it never modifies the MasterRune
+except through its locked cache.  Changing it (add_restriction(),
+add_prefix()) while other threads check with it is not.
+
     """
+    __slots__ = ('shabase', 'seclen', 'prefixes', 'cache', 'revocations')
+
     def __init__(self,
                  seedsecret: bytes,
                  restrictions: Sequence[Restriction] = [],
                  unique_id: Optional[Union[int, str]] = None,
-                 version: Optional[Union[int, str]] = None):
+                 version: Optional[Union[int, str]] = None,
+                 cache_size: int = 0,
+                 cache_ttl: Optional[float] = None,
+                 revocations: Optional[RevocationSet] = None):
         # If they provide a unique_id, it goes first.
         if unique_id is not None:
             restrictions = [Restriction.unique_id(unique_id, version)] + list(restrictions)
@@ -369,20 +1072,47 @@ optional version), which gets included as an empty-fieldname field.
         self.restrictions = []
         # Everyone assumes that seed secret takes 1 block only
         assert len(seedsecret) + 1 + 8 <= 64
-        self.shaobj = sha256.sha256()
-        self.shaobj.update(seedsecret + end_shastream(len(seedsecret)))
+        # We only hold the secret (padded) long enough to hash it.
+        block = seedsecret + end_shastream(len(seedsecret))
+        self.shaobj = sha256()
+        self.shaobj.update(block)
+        # For fast calc using hashlib: this covers the entire first block,
+        # so every check starts after it.
+        self.shabase = hashlib.sha256()
+        self.shabase.update(block)
+        del block
+
         for r in restrictions:
             self.add_restriction(r)
 
-        # For fast calc using hashlib
-        self.shabase = hashlib.sha256()
-        self.shabase.update(seedsecret)
         self.seclen = len(seedsecret)
+        self.prefixes = _PrefixNode(hashlib.sha256(seedsecret).digest(), self.shabase, 64)
+        self.add_prefix(self.restrictions)
+
+        self.cache: Optional[RuneCache] = None
+        if cache_size:
+            self.cache = RuneCache(cache_size, cache_ttl)
+        self.revocations = revocations
+
+    def _new_cache(self) -> Optional[RuneCache]:
+        """An empty cache with the same settings as ours (for copies)"""
+        if self.cache is None:
+            return None
+        return RuneCache(self.cache.maxsize, self.cache.ttl)
 
     def copy(self) -> 'Rune':
         """Perform a shallow copy"""
         return self.__copy__()
 
+    def __reduce__(self) -> Tuple[Any, ...]:
+        raise TypeError("MasterRune holds the hash state of your secret, so it"
+                        " isn't pickled: send the secret deliberately, or send"
+                        " Runes (to_snapshot() gives this as a plain Rune)")
+
+    @classmethod
+    def from_snapshot(cls, snapshot: bytes) -> 'Rune':
+        raise TypeError("Snapshots don't hold secrets: use Rune.from_snapshot()")
+
     def __copy__(self) -> 'MasterRune':
         # Create dummy so we can populate it (we don't store secret)
         ret = MasterRune(bytes())
@@ -390,64 +1120,279 @@ optional version), which gets included as an empty-fieldname field.
         ret.shaobj.state = self.shaobj.state
         ret.shabase = self.shabase
         ret.seclen = self.seclen
+        # Same secret, so the same prefixes are valid.
+        ret.prefixes = self.prefixes
+        ret.cache = self._new_cache()
+        ret.revocations = self.revocations
         return ret
 
     def __deepcopy__(self, memo=None) -> 'MasterRune':
-        """sha256.sha256 doesn't implement pickle"""
+        """Our sha256 doesn't implement pickle"""
         ret = MasterRune(bytes())
         ret.restrictions = copy.deepcopy(self.restrictions)
         ret.shaobj.state = self.shaobj.state
         ret.shabase = self.shabase
         ret.seclen = self.seclen
+        # Same secret, so the same prefixes are valid.
+        ret.prefixes = self.prefixes
+        ret.cache = self._new_cache()
+        ret.revocations = self.revocations
         return ret
 
+    def mint_many(self,
+                  ids: Iterable[Union[int, str]],
+                  restrictions: Sequence[Restriction] = [],
+                  version: Optional[Union[int, str]] = None) -> Iterator[str]:
+        """Generates the runestring for each unique id in turn, with these
+        restrictions following it: the same as
+        MasterRune(secret, restrictions, unique_id, version).to_base64(),
+        but the restrictions are only encoded once, and we only need one
+        SHA-256 update per rune"""
+        # unique_id has to be the first restriction.  (Checked now, not
+        # when the first rune is generated.)
+        if self.restrictions != []:
+            raise ValueError("Cannot mint unique_id runes from a MasterRune with restrictions")
+        return self._mint_many(ids, restrictions, version)
+
+    def _mint_many(self,
+                   ids: Iterable[Union[int, str]],
+                   restrictions: Sequence[Restriction],
+                   version: Optional[Union[int, str]]) -> Iterator[str]:
+        encs = [r._encode_bytes() for r in restrictions]
+        restrstr = b''.join(b'&' + enc for enc in encs)
+        # The bytes hashed after the id restriction only depend on its
+        # length, so we build each one once.
+        tails: Dict[int, bytes] = {}
+        # The (escaped) encoding of '-version', after '=0'.
+        versionenc = Restriction.unique_id(0, version).encode().encode()[2:]
+
+        sha = sha256()
+        base = self.shaobj.state
+        for unique_id in ids:
+            # Non-negative ints never need escaping (or have a hyphen).
+            if type(unique_id) is int and unique_id >= 0:
+                idenc = b'=%d' % unique_id + versionenc
+            else:
+                idenc = Restriction.unique_id(unique_id, version).encode().encode()
+
+            tail = tails.get(len(idenc))
+            if tail is None:
+                totlen = base[1] + len(idenc)
+                parts = [end_shastream(totlen)]
+                totlen += len(parts[0])
+                for enc in encs:
+                    totlen += len(enc)
+                    pad = end_shastream(totlen)
+                    totlen += len(pad)
+                    parts += [enc, pad]
+                tail = tails[len(idenc)] = b''.join(parts)
+
+            sha.state = base
+            sha.update(idenc + tail)
+            yield base64.urlsafe_b64encode(sha.state[0] + idenc + restrstr).decode('utf8')
+
+    def add_prefix(self, restrictions: Sequence[Restriction]) -> None:
+        """Precompute the hash states for runes which start with these
+        restrictions (e.g. a unique_id and the restrictions your server
+        always adds), so is_rune_authorized() only hashes the rest"""
+        node = self.prefixes
+        for r in restrictions:
+            node = node.child(r._encode_bytes())
+
     def is_rune_authorized(self, other: Rune) -> bool:
         """This is faster than adding the restrictions one-by-one and checking
         the final authcode (but equivalent)"""
+        encs = [r._encode_bytes() for r in other.restrictions]
+        return other.authcode() == self._authcode_of(encs)
+
+    def _authcode_of(self, encs: Sequence[bytes]) -> bytes:
+        """The authcode a rune with these (encoded) restrictions should
+        have, if it derives from this MasterRune"""
+        # Skip over as much as we've already hashed.
+        node = self.prefixes
+        i = 0
+        while i < len(encs):
+            child = node.children.get(encs[i])
+            if child is None:
+                break
+            node = child
+            i += 1
+        if i == len(encs):
+            return node.authcode
+
         # Make copy, as we're going to update state.
-        sha = self.shabase.copy()
-        totlen = self.seclen
-        for r in other.restrictions:
+        sha = node.sha.copy()
+        totlen = node.length
+        stream = []
+        for enc in encs[i:-1]:
+            stream.append(enc)
+            totlen += len(enc)
             pad = end_shastream(totlen)
-            sha.update(pad)
+            stream.append(pad)
             totlen += len(pad)
-            enc = bytes(r.encode(), encoding='utf8')
-            sha.update(enc)
-            totlen += len(enc)
-
-        return other.authcode() == sha.digest()
+        stream.append(encs[-1])
+        sha.update(b''.join(stream))
+        return sha.digest()
+
+    def _authorized_rune(self, b64str: str) -> Tuple[Optional[Rune], str]:
+        """Returns the Rune if b64str is valid and derives from this
+        MasterRune, otherwise None and the reason"""
+        if self.cache is not None:
+            rune = self.cache.get(b64str)
+        else:
+            rune = None
+        if rune is None:
+            try:
+                rune = Rune.from_base64(b64str)
+            except:  # noqa: E722
+                return None, "runestring invalid"
+            if not self.is_rune_authorized(rune):
+                return None, "rune authcode invalid"
+            if self.cache is not None:
+                self.cache.put(b64str, rune)
+        # Not cached, since it can be revoked at any time.
+        if self.revocations is not None and _rune_id(rune) in self.revocations:
+            return None, "id: revoked"
+        return rune, ''
 
     def check_with_reason(self, b64str: str, values: Dict[str, Any]) -> Tuple[bool, str]:
         """All-in-one check that a runestring is valid, derives from this
 MasterRune and passes all its conditions against the given dictionary
 of values or callables"""
-        try:
-            rune = Rune.from_base64(b64str)
-        except:  # noqa: E722
-            return False, "runestring invalid"
-        if not self.is_rune_authorized(rune):
-            return False, "rune authcode invalid"
+        rune, whyfail = self._authorized_rune(b64str)
+        if rune is None:
+            return False, whyfail
         return rune.are_restrictions_met(values)
 
+    async def check_with_reason_async(self, b64str: str, values: Dict[str, Any]) -> Tuple[bool, str]:
+        """Same as self.check_with_reason(), but callables in values may
+        return awaitables (see Rune.are_restrictions_met_async())"""
+        rune, whyfail = self._authorized_rune(b64str)
+        if rune is None:
+            return False, whyfail
+        return await rune.are_restrictions_met_async(values)
+
+    def check(self, b64str: str, values: Dict[str, Any]) -> bool:
+        """Same as self.check_with_reason(b64str, values)[0], but never
+        formats a reason"""
+        rune, _ = self._authorized_rune(b64str)
+        return rune is not None and rune.is_met(values)
+
+    def check_many(self,
+                   b64strs: Sequence[str],
+                   values_list: Sequence[Dict[str, Any]]) -> List[Tuple[bool, str]]:
+        """check_with_reason() for each runestring against the corresponding
+values; identical runestrings in the batch are only parsed and
+authorized once (and tested with a compiled test if repeated)."""
+        if len(b64strs) != len(values_list):
+            raise ValueError("check_many needs one values dict per runestring")
+
+        # Each distinct runestring maps to its test, or the failure.
+        tests: Dict[str, Union[Callable[[Dict[str, Any]], Tuple[bool, str]],
+                               Tuple[bool, str]]] = {}
+        for b64str, count in Counter(b64strs).items():
+            rune, whyfail = self._authorized_rune(b64str)
+            if rune is None:
+                tests[b64str] = (False, whyfail)
+            elif count > 1:
+                tests[b64str] = rune.compile()
+            else:
+                tests[b64str] = rune.are_restrictions_met
+
+        results = []
+        for b64str, values in zip(b64strs, values_list):
+            test = tests[b64str]
+            if callable(test):
+                results.append(test(values))
+            else:
+                results.append(test)
+        return results
+
+    def check_many_parallel(self,
+                            b64strs: Sequence[str],
+                            values_list: Sequence[Dict[str, Any]],
+                            executor: Optional[Any] = None,
+                            max_workers: Optional[int] = None) -> List[Tuple[bool, str]]:
+        """check_many(), split into chunks run on executor (a
+concurrent.futures.Executor), or a ThreadPoolExecutor of max_workers
+threads made for the call.  Results are in order.
+
+Threads only run in parallel where the GIL is released (hashing long
+runes, callables in values doing I/O) or on a free-threaded Python."""
+        if len(b64strs) != len(values_list):
+            raise ValueError("check_many needs one values dict per runestring")
+        from concurrent.futures import ThreadPoolExecutor
+
+        pool = executor if executor is not None else ThreadPoolExecutor(max_workers)
+        try:
+            # A few chunks per worker, so an unlucky one doesn't hold us up.
+            nchunks = (max_workers or os.cpu_count() or 1) * 4
+            size = max((len(b64strs) + nchunks - 1) // nchunks, 1)
+            futures = [pool.submit(self.check_many, b64strs[i:i + size], values_list[i:i + size])
+                       for i in range(0, len(b64strs), size)]
+            results: List[Tuple[bool, str]] = []
+            for fut in futures:
+                results += fut.result()
+            return results
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+
+# check() and check_with_reason() reuse the MasterRunes they build.  They
+# are keyed by a keyed hash of the secret: not the secret itself, nor
+# sha256(secret), which is the authcode of an unrestricted rune!
+_MASTER_CACHE_SIZE = 64
+_master_cache: 'OrderedDict[bytes, MasterRune]' = OrderedDict()
+_master_cache_lock = threading.Lock()
+_master_cache_key = os.urandom(32)
+
+
+def _cached_master(secret: bytes) -> MasterRune:
+    """The MasterRune for this secret, from the cache if we can"""
+    key = hashlib.blake2b(secret, key=_master_cache_key, digest_size=32).digest()
+    with _master_cache_lock:
+        master = _master_cache.get(key)
+        if master is not None:
+            _master_cache.move_to_end(key)
+            return master
+
+    # Don't hold the lock while hashing.
+    master = MasterRune(secret)
+    with _master_cache_lock:
+        _master_cache[key] = master
+        if len(_master_cache) > _MASTER_CACHE_SIZE:
+            _master_cache.popitem(last=False)
+    return master
+
+
+def clear_check_cache() -> None:
+    """Forget the MasterRunes check() and check_with_reason() have cached.
+
+The cache never holds your secrets, but a MasterRune's hash state can
+still authorize runes, so call this when you retire a secret.
+
+    """
+    with _master_cache_lock:
+        _master_cache.clear()
+
 
 def check_with_reason(secret: bytes, b64str: str, values: Dict[str, Any]) -> Tuple[bool, str]:
     """Convenience function that the b64str runestring is valid, derives
-from our secret, and passes against these values.  If you want to
-check many runes, it's more efficient to create the MasterRune first
-then check them, but this is fine if you're only checking one.
+from our secret, and passes against these values.  The MasterRune for
+each recently-used secret is cached (see clear_check_cache()), so this
+is nearly as fast as creating the MasterRune yourself.
 
     """
-    return MasterRune(secret).check_with_reason(b64str, values)
+    return _cached_master(secret).check_with_reason(b64str, values)
 
 
 def check(secret: bytes, b64str: str, values: Dict[str, Any]) -> bool:
     """Convenience function that the b64str runestring is valid, derives
-from our secret, and passes against these values.  If you want to
-check many runes, it's more efficient to create the MasterRune first
-then check them, but this is fine if you're only checking one.
+from our secret, and passes against these values.
 
-Unlike check_with_reason(), this discards the reason and returns a
-simple True or False.
+Unlike check_with_reason(), this never works out the reason, and
+returns a simple True or False.
 
     """
-    return check_with_reason(secret, b64str, values)[0]
+    return _cached_master(secret).check(b64str, values)
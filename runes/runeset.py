@@ -0,0 +1,242 @@
+"""Find which of many runes a set of values passes.
+
+A RuneSet indexes the alternatives of all its runes' restrictions by
+field and condition: a dict for '=', prefixes, suffixes and substrings
+by length for '^', '$' and '~', and sorted lists for '<', '>', '{' and
+'}'.  matching() looks up each of the values in those, finds the
+restrictions which pass, then counts them per rune: it only touches
+alternatives which pass (and '/' alternatives on present fields), not
+every rune.
+"""
+import bisect
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .runes import Alternative, Rune
+
+
+class _SortedIndex(object):
+    """(key, restriction id) pairs, sorted by key when we search them"""
+    __slots__ = ('pairs', 'sorted', 'dirty')
+
+    def __init__(self) -> None:
+        self.pairs: List[Tuple[Any, int]] = []
+        # Keys and restriction ids, replaced together so concurrent
+        # readers never see one without the other.
+        self.sorted: Tuple[List[Any], List[int]] = ([], [])
+        self.dirty = False
+
+    def add(self, key: Any, rid: int) -> None:
+        self.pairs.append((key, rid))
+        self.dirty = True
+
+    def _sort(self) -> Tuple[List[Any], List[int]]:
+        if self.dirty:
+            pairs = sorted(self.pairs)
+            self.sorted = ([k for k, _ in pairs], [r for _, r in pairs])
+            self.dirty = False
+        return self.sorted
+
+    def above(self, key: Any) -> List[int]:
+        """Restriction ids of keys greater than key"""
+        keys, rids = self._sort()
+        return rids[bisect.bisect_right(keys, key):]
+
+    def below(self, key: Any) -> List[int]:
+        """Restriction ids of keys less than key"""
+        keys, rids = self._sort()
+        return rids[:bisect.bisect_left(keys, key)]
+
+
+class _AffixIndex(object):
+    """Values mapped to restriction ids, and the lengths of those values,
+    so we can look up every prefix (suffix, substring) of a value which
+    could match"""
+    __slots__ = ('values', 'lengths')
+
+    def __init__(self) -> None:
+        self.values: Dict[str, List[int]] = {}
+        self.lengths: Set[int] = set()
+
+    def add(self, value: str, rid: int) -> None:
+        self.values.setdefault(value, []).append(rid)
+        self.lengths.add(len(value))
+
+
+class _FieldIndex(object):
+    """All the alternatives on one field"""
+    __slots__ = ('eq', 'ne', 'ne_counts', 'prefix', 'suffix', 'contains',
+                 'lt', 'gt', 'before', 'after', 'missing', 'alts')
+
+    def __init__(self) -> None:
+        self.eq: Dict[str, List[int]] = {}
+        self.ne: Dict[str, List[int]] = {}
+        # How many '/' alternatives each restriction has on this field.
+        self.ne_counts: Dict[int, int] = {}
+        self.prefix = _AffixIndex()
+        self.suffix = _AffixIndex()
+        self.contains = _AffixIndex()
+        self.lt = _SortedIndex()
+        self.gt = _SortedIndex()
+        self.before = _SortedIndex()
+        self.after = _SortedIndex()
+        # Restrictions which pass if this field is missing.
+        self.missing: List[int] = []
+        # Every alternative, for when the value is a callable.
+        self.alts: List[Tuple[Alternative, int]] = []
+
+    def add(self, alt: Alternative, rid: int) -> None:
+        self.alts.append((alt, rid))
+        if alt.test({}) is None:
+            self.missing.append(rid)
+
+        cond, value = alt.cond, alt.value
+        if cond == '=':
+            self.eq.setdefault(value, []).append(rid)
+        elif cond == '/':
+            self.ne.setdefault(value, []).append(rid)
+            self.ne_counts[rid] = self.ne_counts.get(rid, 0) + 1
+        elif cond == '^':
+            self.prefix.add(value, rid)
+        elif cond == '$':
+            self.suffix.add(value, rid)
+        elif cond == '~':
+            self.contains.add(value, rid)
+        elif cond in ('<', '>'):
+            # None never passes.
+            if alt._bound is not None:
+                (self.lt if cond == '<' else self.gt).add(alt._bound, rid)
+        elif cond == '{':
+            self.before.add(value, rid)
+        elif cond == '}':
+            self.after.add(value, rid)
+        # '!' never passes if present, and '#' is handled by RuneSet.
+
+    def passing(self, val: Any, out: Set[int]) -> None:
+        """Add the restriction ids which val passes to out"""
+        if callable(val):
+            for alt, rid in self.alts:
+                if alt.test({alt.field: val}) is None:
+                    out.add(rid)
+            return
+
+        # Ints (not bools) compare directly with '<' and '>'.
+        n: Optional[int] = val if type(val) is int else None
+        val = str(val)
+        out.update(self.eq.get(val, ()))
+        if self.ne_counts:
+            failed = self.ne.get(val)
+            if failed is None:
+                out.update(self.ne_counts)
+            else:
+                # Passes unless all its '/' alternatives are this value.
+                failcounts = Counter(failed)
+                out.update(rid for rid, n in self.ne_counts.items() if n > failcounts[rid])
+        for length in self.prefix.lengths:
+            if length <= len(val):
+                out.update(self.prefix.values.get(val[:length], ()))
+        for length in self.suffix.lengths:
+            if length <= len(val):
+                out.update(self.suffix.values.get(val[len(val) - length:], ()))
+        for length in self.contains.lengths:
+            for start in range(len(val) - length + 1):
+                out.update(self.contains.values.get(val[start:start + length], ()))
+        if self.lt.pairs or self.gt.pairs:
+            if n is None:
+                try:
+                    n = int(val)
+                except ValueError:
+                    pass
+            if n is not None:
+                out.update(self.lt.above(n))
+                out.update(self.gt.below(n))
+        out.update(self.before.above(val))
+        out.update(self.after.below(val))
+
+
+class RuneSet(object):
+    """An index over many runes, to find those whose restrictions a given
+set of values meets (as Rune.are_restrictions_met() would say) without
+testing each rune in turn.
+
+Callables in values are called for every alternative on their field,
+in every rune in the set.
+
+Several threads can call matching() at once, but not while another is
+calling add().
+
+    """
+    def __init__(self, runes: Iterable[Rune] = ()):
+        self.runes: List[Rune] = []
+        # Identical restrictions share an id: encoding -> id
+        self._rids: Dict[str, int] = {}
+        # For each restriction id, the runes which have it
+        self._rune_idxs: List[List[int]] = []
+        # How many (distinct) restrictions each rune has
+        self._needed: List[int] = []
+        self._fields: Dict[str, _FieldIndex] = {}
+        # Restrictions with a '#' alternative
+        self._always: List[int] = []
+        # Runes with no restrictions at all
+        self._unrestricted: List[int] = []
+        for rune in runes:
+            self.add(rune)
+
+    def __len__(self) -> int:
+        return len(self.runes)
+
+    def add(self, rune: Rune) -> int:
+        """Add a rune (a snapshot of its current restrictions): returns its
+        index in self.runes"""
+        idx = len(self.runes)
+        self.runes.append(rune)
+        rids = set()
+        for r in rune.restrictions:
+            enc = r.encode()
+            rid = self._rids.get(enc)
+            if rid is None:
+                rid = self._rids[enc] = len(self._rune_idxs)
+                self._rune_idxs.append([])
+                for alt in r.alternatives:
+                    if alt.cond == '#':
+                        self._always.append(rid)
+                    else:
+                        fidx = self._fields.get(alt.field)
+                        if fidx is None:
+                            fidx = self._fields[alt.field] = _FieldIndex()
+                        fidx.add(alt, rid)
+            if rid not in rids:
+                rids.add(rid)
+                self._rune_idxs[rid].append(idx)
+        self._needed.append(len(rids))
+        if not rids:
+            self._unrestricted.append(idx)
+        return idx
+
+    def passing_restrictions(self, values: Dict[str, Any]) -> Set[int]:
+        """The ids of the (distinct) restrictions which values meets"""
+        passed = set(self._always)
+        for field, fidx in self._fields.items():
+            if field in values:
+                fidx.passing(values[field], passed)
+            else:
+                passed.update(fidx.missing)
+        return passed
+
+    def matching(self, values: Dict[str, Any]) -> List[int]:
+        """Indices (in self.runes) of the runes whose restrictions values
+        meets, in order"""
+        counts: Dict[int, int] = {}
+        for rid in self.passing_restrictions(values):
+            for idx in self._rune_idxs[rid]:
+                counts[idx] = counts.get(idx, 0) + 1
+
+        needed = self._needed
+        matches = [idx for idx, count in counts.items() if count == needed[idx]]
+        matches += self._unrestricted
+        matches.sort()
+        return matches
+
+    def matching_runes(self, values: Dict[str, Any]) -> List[Rune]:
+        """The runes whose restrictions values meets"""
+        return [self.runes[idx] for idx in self.matching(values)]
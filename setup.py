@@ -38,6 +38,7 @@ setup(name='runes',
       author_email='rusty@rustcorp.com.au',
       license='MIT',
       scripts=[],
+      entry_points={'console_scripts': ['runes=runes.__main__:main']},
       zip_safe=True,
       packages=['runes'],
       install_requires=requirements)
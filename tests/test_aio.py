@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+import runes
+from runes.aio import BatchLookup
+
+
+def test_are_restrictions_met_async():
+    rune = runes.MasterRune(bytes(16), [runes.Restriction.from_str('f1=1|f2<2'),
+                                        runes.Restriction.from_str('f3!')])
+    for values in ({}, {'f1': 1}, {'f2': 1, 'f3': 1}, {'f2': 3}):
+        assert asyncio.run(rune.are_restrictions_met_async(values)) == rune.are_restrictions_met(values)
+
+    async def slow_fail(alt):
+        await asyncio.sleep(0)
+        return 'slow {}'.format(alt.encode())
+
+    async def slow_pass(alt):
+        await asyncio.sleep(0)
+        return None
+
+    assert asyncio.run(rune.are_restrictions_met_async({'f1': slow_pass})) == (True, '')
+    assert asyncio.run(rune.are_restrictions_met_async({'f1': slow_fail})) == (False, 'slow f1=1 AND f2: is missing')
+    assert asyncio.run(rune.are_restrictions_met_async({'f1': slow_fail, 'f2': slow_fail})) == (False, 'slow f1=1 AND slow f2<2')
+    assert asyncio.run(rune.are_restrictions_met_async({'f1': slow_fail, 'f2': 1, 'f3': slow_fail})) == (False, 'slow f3!')
+
+    # A synchronous pass doesn't wait for (or leak) earlier coroutines.
+    assert asyncio.run(rune.are_restrictions_met_async({'f1': slow_fail, 'f2': 1})) == (True, '')
+
+
+def test_alternatives_concurrent():
+    """Alternatives' awaitables run concurrently, and the first pass wins"""
+    restr = runes.Restriction.from_str('f1=1|f2=2')
+    cancelled = []
+
+    async def main():
+        event = asyncio.Event()
+
+        async def waits(alt):
+            try:
+                await event.wait()
+            except asyncio.CancelledError:
+                cancelled.append(alt.field)
+                raise
+            return 'waited'
+
+        async def sets(alt):
+            event.set()
+            return 'set'
+
+        # Would deadlock if f1 were awaited before f2 was called.
+        assert await restr.test_async({'f1': waits, 'f2': sets}) == 'waited AND set'
+
+        event.clear()
+
+        async def passes(alt):
+            return None
+
+        assert await restr.test_async({'f1': waits, 'f2': passes}) is None
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == ['f1']
+
+
+def test_restriction_order():
+    """Restrictions are still tested in order, one at a time"""
+    rune = runes.Rune(bytes(32), restrictions=[runes.Restriction.from_str(s)
+                                               for s in ('f1=1', 'f2=2', 'f3=3')])
+    order = []
+
+    def recorder(fail):
+        async def record(alt):
+            order.append(alt.field)
+            await asyncio.sleep(0)
+            return 'failed' if alt.field == fail else None
+        return record
+
+    values = {f: recorder('f2') for f in ('f1', 'f2', 'f3')}
+    assert asyncio.run(rune.are_restrictions_met_async(values)) == (False, 'failed')
+    assert order == ['f1', 'f2']
+
+
+def test_check_with_reason_async():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    runestr = runes.MasterRune(secret, [runes.Restriction.from_str('f1=1')], unique_id=7).to_base64()
+
+    async def not_revoked(alt):
+        return None if alt.value != '8' else 'id: revoked'
+
+    assert asyncio.run(mr.check_with_reason_async(runestr, {'': not_revoked, 'f1': 1})) == (True, '')
+    assert asyncio.run(mr.check_with_reason_async(runestr, {'': not_revoked, 'f1': 2})) == (False, 'f1: != 1')
+    assert asyncio.run(mr.check_with_reason_async(runestr[:-1], {})) == (False, 'runestring invalid')
+
+
+def test_batch_lookup():
+    fetched = []
+
+    async def fetch(keys):
+        fetched.append(sorted(keys))
+        await asyncio.sleep(0)
+        return {k: 'revoked' for k in keys if k in ('2', '4')}
+
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    runestrs = [runes.MasterRune(secret, unique_id=i).to_base64() for i in range(6)] * 2
+
+    async def main(lookup):
+        async def check_id(alt):
+            why = await lookup.lookup(alt.value)
+            return None if why is None else 'id: {}'.format(why)
+
+        return await asyncio.gather(*[mr.check_with_reason_async(r, {'': check_id}) for r in runestrs])
+
+    lookup = BatchLookup(fetch)
+    results = asyncio.run(main(lookup))
+    assert [ok for ok, _ in results] == [True, True, False, True, False, True] * 2
+    assert results[2] == (False, 'id: revoked')
+    # All twelve concurrent checks shared one fetch.
+    assert fetched == [['0', '1', '2', '3', '4', '5']]
+    assert lookup.batches == 1
+
+    fetched.clear()
+    lookup = BatchLookup(fetch, maxbatch=4)
+    asyncio.run(main(lookup))
+    assert fetched == [['0', '1', '2', '3'], ['4', '5']]
+
+    async def broken(keys):
+        raise RuntimeError("store down")
+
+    with pytest.raises(RuntimeError, match='store down'):
+        asyncio.run(main(BatchLookup(broken)))
+
+
+def test_batch_lookup_cancelled():
+    async def hang(keys):
+        await asyncio.Event().wait()
+
+    async def main():
+        lookup = BatchLookup(hang)
+        lookups = [asyncio.ensure_future(lookup.lookup(k)) for k in 'abc']
+        await asyncio.sleep(0.01)
+        # We hold the fetch task, not just the event loop.
+        assert len(lookup._tasks) == 1
+        for task in lookup._tasks:
+            task.cancel()
+        results = await asyncio.gather(*lookups, return_exceptions=True)
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
+        assert lookup._tasks == set()
+        assert lookup._inflight == {}
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import runes
+from runes.keyring import MasterRuneRing
+from runes.revocation import RevocationSet
+
+
+def test_keyring():
+    old, new = bytes(16), bytes([1] * 16)
+    ring = MasterRuneRing({'old': old, 'new': new})
+    assert ring.keys() == ['old', 'new']
+
+    oldrune = runes.MasterRune(old, [runes.Restriction.from_str('method=get')], unique_id=1).to_base64()
+    newrune = runes.MasterRune(new, [runes.Restriction.from_str('method=get')], unique_id=2).to_base64()
+    otherrune = runes.MasterRune(bytes([2] * 16), unique_id=3).to_base64()
+
+    assert ring.check_with_key(oldrune, {'method': 'get'}) == (True, '', 'old')
+    assert ring.check_with_key(newrune, {'method': 'put'}) == (False, 'method: != get', 'new')
+    # The last key to succeed is tried first.
+    assert ring.keys() == ['new', 'old']
+    assert ring.check_with_reason(newrune, {'method': 'get'}) == (True, '')
+    assert ring.check(oldrune, {'method': 'get'})
+    assert not ring.check(oldrune, {'method': 'put'})
+    assert ring.check_with_key(otherrune, {}) == (False, 'rune authcode invalid', None)
+    assert ring.check_with_reason(oldrune[:-2], {}) == (False, 'runestring invalid')
+    assert ring.matches == {'old': 3, 'new': 2}
+
+    ring.remove('old')
+    assert ring.keys() == ['new']
+    assert ring.check_with_reason(oldrune, {}) == (False, 'rune authcode invalid')
+    ring.add('other', bytes([2] * 16))
+    assert ring.keys() == ['new', 'other']
+    assert ring.check_with_key(otherrune, {}) == (True, '', 'other')
+
+    ring.revocations = RevocationSet([3])
+    assert ring.check_with_key(otherrune, {}) == (False, 'id: revoked', None)
+
+    # A key removed (emptying the ring) after matching_key() found it.
+    ring = MasterRuneRing({'only': old})
+    ring.remove('only')
+    ring._used('only')
+    assert ring.keys() == []
+
+
+def test_keyring_versions():
+    # Versioned ids need the caller to accept the version.
+    values = {'': lambda alt: None}
+    secrets = {'k1': bytes(16), 'k2': bytes([1] * 16)}
+    ring = MasterRuneRing(secrets, versions={'1': 'k1', '2': 'k2'})
+    v2 = runes.MasterRune(secrets['k2'], unique_id=5, version=2).to_base64()
+    assert ring.check_with_key(v2, values) == (True, '', 'k2')
+
+    # A hinted rune is only checked against its key.
+    wrong = runes.MasterRune(secrets['k1'], unique_id=5, version=2).to_base64()
+    assert ring.check_with_reason(wrong, values) == (False, 'rune authcode invalid')
+    assert ring.matches == {'k2': 1}
+
+    # Unmapped versions, and no version, try every key.
+    v3 = runes.MasterRune(secrets['k1'], unique_id=5, version=3).to_base64()
+    plain = runes.MasterRune(secrets['k2']).to_base64()
+    assert ring.check_with_key(v3, values) == (True, '', 'k1')
+    assert ring.check_with_key(plain, values) == (True, '', 'k2')
@@ -0,0 +1,100 @@
+import signal
+import subprocess
+import sys
+
+import pytest
+
+import runes
+from runes.__main__ import main
+
+
+def test_main(tmp_path, capsys):
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    good = list(mr.mint_many(range(50), [runes.Restriction.from_str('time<100')]))
+    bad = runes.MasterRune(bytes([1] * 16)).to_base64()
+    runefile = tmp_path / 'runes.txt'
+    runefile.write_text('\n'.join(good[:25] + [bad, '', 'garbage'] + good[25:]) + '\n')
+
+    # Without values we only check authorization.
+    assert main(['--secret', secret.hex(), '-j', '1', str(runefile)]) == 1
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert len(lines) == 52
+    assert lines[:25] == ['PASS\t' + r for r in good[:25]]
+    assert lines[25] == 'FAIL\t{}\trune authcode invalid'.format(bad)
+    assert lines[26] == 'FAIL\tgarbage\trunestring invalid'
+    assert lines[27:] == ['PASS\t' + r for r in good[25:]]
+    assert 'Checked 52 runes' in err
+
+    # Ordered output from the pool is the same.
+    assert main(['--secret', secret.hex(), '-j', '2', '--chunksize', '4', str(runefile)]) == 1
+    assert capsys.readouterr()[0].splitlines() == lines
+
+    # Unordered has the same results, and values get tested.
+    assert main(['--secret', secret.hex(), '-j', '2', '--chunksize', '4', '--unordered',
+                 '--values', '{"time": 200}', str(runefile)]) == 1
+    out, err = capsys.readouterr()
+    assert sorted(out.splitlines()) == sorted(['FAIL\t{}\ttime: >= 100'.format(r) for r in good]
+                                              + lines[25:27])
+
+    runefile.write_text('\n'.join(good) + '\n')
+    assert main(['--secret', secret.hex(), '-j', '1', '--values', '{"time": 50}', str(runefile)]) == 0
+
+
+def test_main_revoked(tmp_path, capsys):
+    secret = bytes(16)
+    good = list(runes.MasterRune(secret).mint_many(range(10)))
+    runefile = tmp_path / 'runes.txt'
+    runefile.write_text('\n'.join(good) + '\n')
+    snapshot = str(tmp_path / 'revoked')
+    runes.RevocationSet(range(3, 6)).save(snapshot)
+
+    for jobs in ('1', '2'):
+        assert main(['--secret', secret.hex(), '-j', jobs, '--revoked', snapshot, str(runefile)]) == 1
+        lines = capsys.readouterr()[0].splitlines()
+        assert lines == ['FAIL\t{}\tid: revoked'.format(r) if 3 <= i < 6 else 'PASS\t' + r
+                         for i, r in enumerate(good)]
+
+
+def _run(args, **kwargs):
+    return subprocess.Popen([sys.executable, '-u', '-m', 'runes'] + args,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+
+
+def test_main_stops_early(tmp_path):
+    secret = bytes(16)
+    good = list(runes.MasterRune(secret).mint_many(range(5000)))
+    runefile = tmp_path / 'runes.txt'
+    runefile.write_text('\n'.join(good) + '\n')
+
+    # Like `| head -1`: far more output than the pipe holds.
+    for jobs in ('1', '2'):
+        proc = _run(['--secret', secret.hex(), '-j', jobs, '--chunksize', '4', str(runefile)])
+        assert proc.stdout.readline() == 'PASS\t{}\n'.format(good[0]).encode()
+        proc.stdout.close()
+        assert proc.wait(timeout=30) == 1
+        assert proc.stderr.read() == b''
+
+    # Ctrl-C while it's waiting for more input.
+    proc = _run(['--secret', secret.hex(), '-j', '2', '--chunksize', '1'], stdin=subprocess.PIPE)
+    proc.stdin.write(good[0].encode() + b'\n')
+    proc.stdin.flush()
+    assert proc.stdout.readline() == 'PASS\t{}\n'.format(good[0]).encode()
+    proc.send_signal(signal.SIGINT)
+    assert proc.wait(timeout=30) == 130
+    assert b'Traceback' not in proc.stderr.read()
+    proc.stdin.close()
+
+
+def test_main_bad_args(capsys):
+    secret = bytes(16).hex()
+    for args, err in ((['--chunksize', '0'], '--chunksize must be at least 1'),
+                      (['--chunksize', '-1'], '--chunksize must be at least 1'),
+                      (['-j', '0'], '--jobs must be at least 1'),
+                      (['--values', '{"time": '], '--values must be a JSON object'),
+                      (['--values', '[1]'], '--values must be a JSON object')):
+        with pytest.raises(SystemExit) as e:
+            main(['--secret', secret] + args)
+        assert e.value.code == 2
+        assert err in capsys.readouterr()[1]
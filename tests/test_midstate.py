@@ -0,0 +1,55 @@
+import hashlib
+import pytest
+import sha256  # type: ignore
+from runes import midstate
+
+
+@pytest.mark.skipif(midstate.BACKEND != 'openssl', reason="No usable libcrypto")
+def test_openssl_backend():
+    """The OpenSSL backend must agree with hashlib and the sha256 package"""
+    for length in range(0, 200):
+        data = bytes(range(256))[:length]
+        ours = midstate.OpenSSLSha256()
+        ref = sha256.sha256()
+        ours.update(data)
+        ref.update(data)
+        assert ours.state == ref.state
+        assert ours.digest() == hashlib.sha256(data).digest()
+        # digest() doesn't stop us continuing.
+        ours.update(b'x')
+        assert ours.hexdigest() == hashlib.sha256(data + b'x').hexdigest()
+
+    # Continue from a midstate.
+    for start in (64, 128, 64 * 1000):
+        ours = midstate.OpenSSLSha256()
+        ref = sha256.sha256()
+        ours.state = ref.state = (bytes(range(32)), start)
+        for chunk in (b'a', b'b' * 63, b'c' * 100, b'd' * 1000):
+            ours.update(chunk)
+            ref.update(chunk)
+            assert ours.state == ref.state
+
+
+def test_backend_midstate():
+    """Whatever backend we picked, it can continue a hashlib hash"""
+    data = bytes(range(64)) * 3
+    sha = midstate.sha256()
+    sha.update(data[:64])
+    state = sha.state
+    assert state[1] == 64
+
+    sha = midstate.sha256()
+    sha.state = state
+    sha.update(data[64:])
+    assert sha.digest() == hashlib.sha256(data).digest()
+
+
+def test_backend_types():
+    """Every backend takes bytes, and rejects other bytes-like objects
+    (rather than hashing whatever ctypes makes of them)"""
+    for sha in (sha256.sha256(), midstate.sha256()):
+        for bad in ('abc', bytearray(b'abc'), memoryview(b'abc')):
+            with pytest.raises(TypeError):
+                sha.update(bad)  # type: ignore
+        sha.update(b'abc')
+        assert sha.state[1] == 3
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import pytest
+import runes
+from runes.pool import VerifierPool, _RESPONSE
+
+
+def test_pool():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    good = list(mr.mint_many(range(50), [runes.Restriction.from_str('time<100')]))
+    bad = runes.MasterRune(bytes([1] * 16)).to_base64()
+    runestrs = good[:25] + [bad, 'garbage'] + good[25:]
+
+    # Fewer slots than runes, so map() has to wait for them.
+    with VerifierPool(secret, processes=2, slots=4, slotsize=256) as pool:
+        # Without values, only the authcode is checked.
+        assert list(pool.map(runestrs)) == ([(True, '')] * 25
+                                            + [(False, 'rune authcode invalid'), (False, 'runestring invalid')]
+                                            + [(True, '')] * 25)
+        values_list = [{'time': i * 4} for i in range(len(runestrs))]
+        assert list(pool.map(runestrs, values_list)) == mr.check_many(runestrs, values_list)
+
+        # Plenty of work for the workers to race over.
+        assert list(pool.map(good * 40)) == [(True, '')] * 2000
+
+        fut = pool.submit(good[0], {'time': 200})
+        assert fut.result() == (False, 'time: >= 100')
+
+        with pytest.raises(ValueError):
+            pool.submit('x' * 256)
+    with pytest.raises(RuntimeError):
+        pool.submit(good[0])
+
+
+def test_pool_values_and_revoked(tmp_path):
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    good = list(mr.mint_many(range(10), [runes.Restriction.from_str('time<100')]))
+    revoked = tmp_path / 'revoked'
+    runes.RevocationSet([3]).save(str(revoked))
+
+    ctx = multiprocessing.get_context('spawn')
+    with VerifierPool(secret, processes=1, values={'time': 50}, revoked=str(revoked), context=ctx) as pool:
+        results = list(pool.map(good))
+    assert results == [(True, '')] * 3 + [(False, 'id: revoked')] + [(True, '')] * 6
+
+
+def test_pool_backpressure():
+    secret = bytes(16)
+    runestr = runes.MasterRune(secret).to_base64()
+    # No workers, so the only slot is never freed.
+    pool = VerifierPool(secret, processes=0, slots=1)
+    fut = pool.submit(runestr)
+    with pytest.raises(TimeoutError):
+        pool.submit(runestr, timeout=0.01)
+    pool.terminate()
+    with pytest.raises(RuntimeError):
+        fut.result()
+    pool.close()
+
+
+def test_pool_multibyte_reason():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    # A long reason full of 2-byte characters: some slot size cuts one.
+    restr = runes.Restriction([runes.Alternative('a', '{', 'é' * 4) for _ in range(20)])
+    runestr = mr.mint_many([0], [restr]).__next__()
+    whyfail = mr.check_with_reason(runestr, {'a': 'ë'})[1]
+    enc = whyfail.encode('utf8')
+    # Room for the request, but the reason won't fit: cut it mid-character.
+    cut = next(n for n in range(len(runestr) + 30, len(enc)) if enc[n] & 0xC0 == 0x80)
+    with VerifierPool(secret, processes=1, slots=1, slotsize=cut + _RESPONSE.size) as pool:
+        ok, reason = pool.submit(runestr, {'a': 'ë'}).result(timeout=10)
+    assert not ok
+    assert reason == enc[:cut - 1].decode('utf8')
+
+
+def _exit(alt):
+    os._exit(3)
+
+
+def test_pool_worker_dies():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    runestr = list(mr.mint_many([0], [runes.Restriction.from_str('die=1')]))[0]
+
+    with pytest.raises(FileNotFoundError):
+        VerifierPool(secret, processes=1, revoked='/nonexistent')
+
+    ctx = multiprocessing.get_context('fork')
+    pool = VerifierPool(secret, processes=2, slots=2, values={'die': _exit}, context=ctx)
+    futs = [pool.submit(runestr), pool.submit(runestr)]
+    for fut in futs:
+        with pytest.raises(RuntimeError, match='exited unexpectedly'):
+            fut.result(timeout=10)
+    with pytest.raises(RuntimeError, match='broken'):
+        pool.submit(runestr)
+    pool.close()
@@ -0,0 +1,118 @@
+import multiprocessing
+import pytest
+import runes
+from runes.ratelimit import MemoryBackend, RateLimiter, SharedMemoryBackend
+
+
+def make_rune(restrs: str, unique_id=1) -> runes.Rune:
+    return runes.MasterRune(bytes(16), [runes.Restriction.from_str(r) for r in restrs.split('&')],
+                            unique_id=unique_id)
+
+
+@pytest.fixture(params=['memory', 'shared'])
+def backend(request):
+    if request.param == 'memory':
+        yield MemoryBackend()
+    else:
+        backend = SharedMemoryBackend(buckets=16, slots=4, locks=4)
+        yield backend
+        backend.close()
+        backend.unlink()
+
+
+def test_ratelimit(backend):
+    limiter = RateLimiter(backend)
+    rune = make_rune('mintime=10')
+    assert limiter.check(rune, {}, now=100) == (True, '')
+    assert limiter.check(rune, {}, now=105) == (False, 'mintime: too soon')
+    assert limiter.check(rune, {}, now=110) == (True, '')
+    # Different id, different limit.
+    assert limiter.check(make_rune('mintime=10', 2), {}, now=111) == (True, '')
+
+    for restr, ok_after in (('per=5', 5), ('per=2min', 120), ('per=500msec', 0.5),
+                            ('rate=6', 10), ('mintime=0.25', 0.25)):
+        rune = make_rune(restr, restr)
+        assert limiter.check(rune, {}, now=1000) == (True, '')
+        assert limiter.check(rune, {}, now=1000 + ok_after * 0.99)[0] is False
+        assert limiter.check(rune, {}, now=1000 + ok_after) == (True, '')
+
+    for restr, whyfail in (('mintime<5', 'mintime: only supports ='),
+                           ('per=5weeks', 'per: not a valid per'),
+                           ('rate=0', 'rate: not a valid rate'),
+                           ('mintime=-1', 'mintime: not a valid mintime')):
+        assert limiter.check(make_rune(restr, 99), {}) == (False, whyfail)
+
+    assert limiter.check(runes.MasterRune(bytes(16), [runes.Restriction.from_str('rate=1')]), {}) \
+        == (False, 'rate: rune has no unique_id')
+
+
+def test_ratelimit_only_on_success(backend):
+    limiter = RateLimiter(backend)
+    rune = make_rune('mintime=10&method=get', 'x')
+    # A failed check doesn't count as a use.
+    assert limiter.check(rune, {'method': 'put'}, now=100) == (False, 'method: != get')
+    assert limiter.check(rune, {'method': 'get'}, now=101) == (True, '')
+    assert limiter.check(rune, {'method': 'get'}, now=102) == (False, 'mintime: too soon')
+
+    # Alternatives still work: getinfo isn't rate-limited.
+    rune = make_rune('mintime=10|method=getinfo', 'y')
+    assert limiter.check(rune, {'method': 'getinfo'}, now=100) == (True, '')
+    assert limiter.check(rune, {'method': 'getinfo'}, now=101) == (True, '')
+    assert limiter.check(rune, {'method': 'pay'}, now=102) == (False, 'mintime: too soon AND method: != getinfo')
+
+    # The longest passing limit applies.
+    rune = make_rune('mintime=10&per=1min', 'z')
+    assert limiter.check(rune, {}, now=100) == (True, '')
+    assert limiter.check(rune, {}, now=120) == (False, 'per: too soon')
+
+
+def test_ratelimit_check_with_reason():
+    limiter = RateLimiter(clock=lambda: 100.0)
+    master = runes.MasterRune(bytes(16))
+    runestr = make_rune('rate=1').to_base64()
+    assert limiter.check_with_reason(master, runestr, {}) == (True, '')
+    assert limiter.check_with_reason(master, runestr, {}) == (False, 'rate: too soon')
+    assert limiter.check_with_reason(master, runestr[:-2], {}) == (False, 'runestring invalid')
+
+
+def test_shared_eviction():
+    backend = SharedMemoryBackend(buckets=1, slots=2, locks=1)
+    try:
+        assert backend.acquire('a', 100, 10)
+        assert backend.acquire('b', 101, 10)
+        assert not backend.acquire('a', 102, 10)
+        # Full: evicts the least recently used ('a').
+        assert backend.acquire('c', 103, 10)
+        assert backend.last('a') is None
+        assert backend.last('b') == 101
+        assert backend.acquire('a', 104, 10)
+    finally:
+        backend.close()
+        backend.unlink()
+
+
+def _worker(limiter, rune, start, results):
+    start.wait()
+    results.put(limiter.check(rune, {}, now=100)[0])
+
+
+def test_shared_across_processes():
+    ctx = multiprocessing.get_context('fork')
+    backend = SharedMemoryBackend(buckets=64)
+    try:
+        limiter = RateLimiter(backend)
+        rune = make_rune('mintime=10')
+        start = ctx.Event()
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(limiter, rune, start, results)) for _ in range(4)]
+        for p in procs:
+            p.start()
+        start.set()
+        for p in procs:
+            p.join()
+        # Exactly one of them got to use it.
+        assert sorted(results.get() for _ in procs) == [False, False, False, True]
+        assert backend.last('1') == 100
+    finally:
+        backend.close()
+        backend.unlink()
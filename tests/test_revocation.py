@@ -0,0 +1,127 @@
+import copy
+import random
+import pytest
+import runes
+import threading
+from runes.revocation import RevocationSet
+
+
+def test_revocation_set():
+    revoked = RevocationSet([5, '6', 7, 'abc', '09', -1, 2**70])
+    assert revoked.ranges() == [(5, 8)]
+    assert revoked.others() == {'abc', '09', '-1', str(2**70)}
+    assert len(revoked) == 7
+    for unique_id in (5, '5', 6, '7', 'abc', '09', -1, '-1', 2**70):
+        assert unique_id in revoked
+    for unique_id in (4, '4', 8, 9, '9', 'ab', '', '05', 2**64):
+        assert unique_id not in revoked
+
+    # Ranges merge with anything they overlap or touch.
+    revoked.add_range(10, 20)
+    revoked.add(9)
+    assert revoked.ranges() == [(5, 8), (9, 20)]
+    revoked.add(8)
+    assert revoked.ranges() == [(5, 20)]
+    revoked.add_range(0, 2)
+    revoked.add_range(30, 40)
+    revoked.add_range(1, 31)
+    assert revoked.ranges() == [(0, 40)]
+    revoked.update([45, 41, 43, 42, 100, 40])
+    assert revoked.ranges() == [(0, 44), (45, 46), (100, 101)]
+
+    with pytest.raises(ValueError):
+        revoked.add_range(-1, 5)
+    for bad in (True, False, 1.0, None, b'1'):
+        with pytest.raises(TypeError):
+            RevocationSet([bad])
+        with pytest.raises(TypeError):
+            revoked.add(bad)
+        with pytest.raises(TypeError):
+            bad in revoked
+
+    # A million consecutive ids are one range.
+    many = RevocationSet()
+    many.update(range(1000000))
+    assert many.ranges() == [(0, 1000000)]
+    assert len(many) == 1000000
+
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / 'revoked')
+    revoked = RevocationSet(list(range(0, 1000, 2)) + ['abc', 'x\n|&'])
+    revoked.save(path)
+
+    loaded = RevocationSet.load(path)
+    assert loaded.ranges() == revoked.ranges()
+    assert loaded.others() == revoked.others()
+    for i in range(1001):
+        assert (i in loaded) == (i % 2 == 0 and i < 1000)
+    assert 'x\n|&' in loaded
+
+    # Changing a loaded set copies it, leaving the file alone.
+    loaded.add(1)
+    assert 1 in loaded
+    assert 1 not in RevocationSet.load(path)
+
+    RevocationSet().save(path)
+    assert len(RevocationSet.load(path)) == 0
+
+    (tmp_path / 'bad').write_bytes(b'RUNEREV1garbage')
+    for bad in ('bad', 'empty'):
+        (tmp_path / 'empty').write_bytes(b'')
+        with pytest.raises(ValueError, match='not a revocation snapshot'):
+            RevocationSet.load(str(tmp_path / bad))
+
+
+def test_master_revocations():
+    secret = bytes(16)
+    revoked = RevocationSet([2])
+    mr = runes.MasterRune(secret, revocations=revoked, cache_size=10)
+    restr = runes.Restriction.from_str('f1=1')
+    runestrs = [runes.MasterRune(secret, [restr], unique_id=i, version=v).to_base64()
+                for i, v in ((1, None), (2, None), (2, 3), (3, None))]
+    unversioned = runes.MasterRune(secret, [restr]).to_base64()
+
+    assert mr.check_with_reason(runestrs[0], {'f1': 1}) == (True, '')
+    assert mr.check_with_reason(runestrs[1], {'f1': 1}) == (False, 'id: revoked')
+    assert mr.check_with_reason(runestrs[2], {'f1': 1}) == (False, 'id: revoked')
+    assert not mr.check(runestrs[2], {'f1': 1})
+    assert mr.check_with_reason(unversioned, {'f1': 1}) == (True, '')
+
+    # Revoking takes effect even for cached runes, and in copies.
+    assert mr.check(runestrs[3], {'f1': 1})
+    revoked.add(3)
+    assert mr.check_with_reason(runestrs[3], {'f1': 1}) == (False, 'id: revoked')
+    for mr2 in (copy.copy(mr), copy.deepcopy(mr)):
+        assert mr2.check_many(runestrs, [{'f1': 1}] * 4) == [(True, '')] + [(False, 'id: revoked')] * 3
+
+
+def test_threads():
+    """Lookups while another thread adds ids never see half an update"""
+    revoked = RevocationSet()
+    ids = list(range(0, 20000, 2))
+    random.Random(1).shuffle(ids)
+    done = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while not done.is_set():
+                for i in range(1, 20000, 398):
+                    assert i not in revoked
+                    assert (i - 1 in revoked) in (True, False)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for t in readers:
+        t.start()
+    try:
+        for i in ids:
+            revoked.add(i)
+    finally:
+        done.set()
+        for t in readers:
+            t.join()
+    assert errors == []
+    assert len(revoked) == 10000
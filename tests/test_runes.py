@@ -1,10 +1,14 @@
 import base64
 import copy
 import hashlib
+import itertools
+import marshal
+import pickle
 import pytest
 import runes
 import sha256  # type: ignore
 import string
+from concurrent.futures import ThreadPoolExecutor
 from typing import Sequence
 
 
@@ -250,6 +254,61 @@ def test_copy():
         assert orig.to_base64() == mrstring
 
 
+def test_derive():
+    mr = runes.MasterRune(bytes(16), [runes.Restriction.from_str('method^list')], unique_id=7)
+    base = runes.Rune.from_base64(mr.to_base64())
+    basestr = base.to_base64()
+    extra = [runes.Restriction.from_str('peer=alice'), runes.Restriction.from_str('time<{}'.format('9' * 70))]
+
+    for parent in (mr, base):
+        for n in range(len(extra) + 1):
+            child = parent.derive(*extra[:n])
+            assert type(child) is runes.Rune
+            expect = base.copy()
+            for r in extra[:n]:
+                expect.add_restriction(r)
+            assert child == expect
+            assert mr.is_rune_authorized(child)
+            # The child can be extended further, and the parent is untouched.
+            child.add_restriction(runes.Restriction.from_str('x=1'))
+            assert mr.is_rune_authorized(child)
+            assert base.to_base64() == basestr
+    assert len(mr.restrictions) == 2
+
+
+def test_int_values():
+    """Int values are compared directly, but must give the same results
+    as their str()"""
+    class MyInt(int):
+        def __str__(self):
+            return 'seven'
+
+    alts = [runes.Alternative.from_str(restr)
+            for restr in ('n<5', 'n>5', 'n<-3', 'n>99999999999999999999', 'n<5x', 'n>')]
+    # int() allows spaces around it.
+    alts.append(runes.Alternative('n', '<', ' 5'))
+    for alt in alts:
+        for val in (4, 5, 6, -4, 0, 10**20, True, False, MyInt(7)):
+            expect = alt.test({'n': str(val)})
+            assert alt.test({'n': val}) == expect, (alt.encode(), val)
+            assert alt.is_met({'n': val}) == (expect is None)
+            restriction = runes.Restriction([alt])
+            failure = restriction.failure({'n': val})
+            assert (failure is None and expect is None) or str(failure) == expect
+
+    # The bound follows changes to the value.
+    alt = runes.Alternative('n', '<', '5')
+    assert alt.test({'n': 7}) == 'n: >= 5'
+    alt.value = '10'
+    assert alt.test({'n': 7}) is None
+    alt.value = 'ten'
+    assert alt.test({'n': 7}) == 'n: not a valid integer'
+    alt.value = '10'
+    alt.cond = '>'
+    assert alt.test({'n': 7}) == 'n: <= 10'
+    assert copy.copy(alt).test({'n': 11}) is None
+
+
 def test_rune_tostring():
     alt1 = runes.Alternative('f1', '!', '')
     alt2 = runes.Alternative('f2', '=', '2')
@@ -384,3 +443,460 @@ def test_unique_id_restrictions():
     mr.add_restriction(runes.Restriction([alt1, alt2]))
     with pytest.raises(ValueError, match="unique_id field cannot have alternatives"):
         runes.Rune.from_base64(mr.to_base64())
+
+
+def test_decode_many_restrictions():
+    """Decoding is done in one pass: make sure offsets line up over a long rune"""
+    mr = runes.MasterRune(bytes(16), unique_id=7)
+    for i in range(500):
+        mr.add_restriction(runes.Restriction([runes.Alternative('f{}'.format(i), '=', 'v|&\\{}'.format(i)),
+                                              runes.Alternative('g{}'.format(i), '<', str(i))]))
+    rune = runes.Rune.from_base64(mr.to_base64())
+    assert rune == mr
+    assert rune.restrictions[0].alternatives[0].is_unique_id()
+    assert rune.restrictions[-1].alternatives[0].value == 'v|&\\499'
+    assert mr.is_rune_authorized(rune)
+
+    # Trailing '|' is swallowed, '&' is left for the restriction.
+    alt, remainder = runes.Alternative.decode('f1=1|f2=2')
+    assert alt == runes.Alternative('f1', '=', '1')
+    assert remainder == 'f2=2'
+    alt, remainder = runes.Alternative.decode('f1=1&f2=2')
+    assert remainder == '&f2=2'
+
+    with pytest.raises(ValueError, match="does not contain any operator"):
+        runes.Restriction.from_str('f1=1|f2')
+    with pytest.raises(ValueError, match="ends with an incomplete escape"):
+        runes.Restriction.from_str('f1=1\\')
+
+
+def test_master_cache(monkeypatch):
+    secret = bytes(16)
+    mr = runes.MasterRune(secret, cache_size=2, cache_ttl=10)
+    runestrs = [runes.Rune(mr.authcode(), unique_id=i,
+                           restrictions=[runes.Restriction.from_str('foo=bar')]).to_base64()
+                for i in range(3)]
+
+    assert mr.check_with_reason(runestrs[0], {'foo': 'bar'}) == (True, '')
+    assert (mr.cache.hits, mr.cache.misses, mr.cache.evictions) == (0, 1, 0)
+    # A hit still tests the restrictions.
+    assert mr.check_with_reason(runestrs[0], {'foo': 'baz'}) == (False, 'foo: != bar')
+    assert (mr.cache.hits, mr.cache.misses, mr.cache.evictions) == (1, 1, 0)
+
+    # Least-recently-used gets evicted.
+    mr.check_with_reason(runestrs[1], {'foo': 'bar'})
+    mr.check_with_reason(runestrs[2], {'foo': 'bar'})
+    assert len(mr.cache) == 2
+    assert mr.cache.evictions == 1
+    assert mr.cache.get(runestrs[0]) is None
+    assert mr.cache.get(runestrs[2]) is not None
+
+    # Failures are never cached.
+    other = runes.MasterRune(bytes([1] * 16)).to_base64()
+    assert mr.check_with_reason(other, {}) == (False, 'rune authcode invalid')
+    assert mr.check_with_reason('!!!', {}) == (False, 'runestring invalid')
+    assert mr.cache.get(other) is None
+
+    # Entries expire.
+    now = runes.runes.time.monotonic()
+    monkeypatch.setattr(runes.runes.time, 'monotonic', lambda: now + 11)
+    assert mr.cache.get(runestrs[2]) is None
+    assert mr.cache.evictions == 2
+
+    # Copies get their own (empty) cache, a different secret can't hit ours.
+    assert len(mr.copy().cache) == 0
+    assert copy.deepcopy(mr).cache.maxsize == 2
+    assert runes.MasterRune(bytes([1] * 16)).check_with_reason(runestrs[1], {'foo': 'bar'}) == (False, 'rune authcode invalid')
+    assert runes.MasterRune(secret).cache is None
+
+
+def test_compile():
+    """Compiled tests must give exactly the same answers"""
+    def callme(alt: runes.Alternative):
+        return "called {}".format(alt.encode())
+
+    values = ['', '0', '1', '-1', '01', '10', 'x', 'ab', '1-2', ' 5', 5, -3, True, 2.5, callme]
+    for cond in ('!', '=', '/', '^', '$', '~', '<', '>', '}', '{', '#'):
+        for value in ('', '1', 'x', '01', '-2', '1-2'):
+            alt = runes.Alternative('f1', cond, value)
+            compiled = alt.compile()
+            assert compiled({}) == alt.test({})
+            for v in values:
+                assert compiled({'f1': v}) == alt.test({'f1': v})
+
+    for value in ('1', '1-2'):
+        alt = runes.Alternative('', '=', value, allow_idfield=True)
+        assert alt.compile()({}) == alt.test({})
+
+    alt1 = runes.Alternative('f1', '!', '')
+    alt2 = runes.Alternative('f2', '=', '2')
+    alt3 = runes.Alternative('f3', '>', '2')
+    rune = runes.Rune(bytes(32), restrictions=[runes.Restriction((alt1, alt2)),
+                                               runes.Restriction((alt3,))])
+    compiled = rune.compile()
+    for values in ({}, {'f1': '1', 'f2': 3}, {'f2': '2'}, {'f3': '2'}, {'f2': '1', 'f3': 3}):
+        assert compiled(values) == rune.are_restrictions_met(values)
+
+    # Changing an alternative changes how it tests.
+    assert alt2.test({'f2': '2'}) is None
+    alt2.cond = '/'
+    assert alt2.test({'f2': '2'}) == 'f2: = 2'
+    alt2.value = '3'
+    assert alt2.test({'f2': '2'}) is None
+    alt2.field = 'f4'
+    assert alt2.test({'f2': '2'}) == 'f4: is missing'
+
+
+def test_check_many():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    rune1 = runes.Rune(mr.authcode(), restrictions=[runes.Restriction.from_str('foo=bar')]).to_base64()
+    rune2 = runes.Rune(mr.authcode(), restrictions=[runes.Restriction.from_str('foo/bar')]).to_base64()
+    badrune = runes.MasterRune(bytes([1] * 16)).to_base64()
+
+    runestrs = [rune1, rune2, rune1, badrune, 'notarune', rune1]
+    values = [{'foo': 'bar'}, {'foo': 'bar'}, {'foo': 'baz'}, {}, {}, {}]
+    assert mr.check_many(runestrs, values) == [mr.check_with_reason(r, v) for r, v in zip(runestrs, values)]
+    assert mr.check_many(runestrs, values) == [(True, ''),
+                                               (False, 'foo: = bar'),
+                                               (False, 'foo: != bar'),
+                                               (False, 'rune authcode invalid'),
+                                               (False, 'runestring invalid'),
+                                               (False, 'foo: is missing')]
+    assert mr.check_many([], []) == []
+
+    with pytest.raises(ValueError):
+        mr.check_many(runestrs, values[1:])
+
+
+def test_check_many_parallel():
+    mr = runes.MasterRune(bytes(16))
+    runestrs = [runes.MasterRune(bytes(16), [runes.Restriction.from_str('n<{}'.format(i % 7))]).to_base64()
+                for i in range(100)] + ['notarune']
+    values = [{'n': i % 5} for i in range(len(runestrs))]
+    expect = mr.check_many(runestrs, values)
+    assert mr.check_many_parallel(runestrs, values, max_workers=4) == expect
+    with ThreadPoolExecutor(2) as executor:
+        assert mr.check_many_parallel(runestrs, values, executor=executor) == expect
+    assert mr.check_many_parallel([], []) == []
+    with pytest.raises(ValueError):
+        mr.check_many_parallel(runestrs, values[1:])
+
+
+def test_threads():
+    """Many threads checking with one (caching) MasterRune"""
+    mr = runes.MasterRune(bytes(16), cache_size=8)
+    good = [mr.copy() for _ in range(20)]
+    for i, r in enumerate(good):
+        r.add_restriction(runes.Restriction.from_str('n={}'.format(i)))
+    runestrs = [r.to_base64() for r in good]
+    bad = runes.MasterRune(bytes([1] * 16)).to_base64()
+
+    def worker(start):
+        for i in range(start, start + 500):
+            n = i % len(runestrs)
+            assert mr.check_with_reason(runestrs[n], {'n': n}) == (True, '')
+            assert mr.check(runestrs[n], {'n': n + 1}) is False
+            assert mr.check_with_reason(bad, {}) == (False, 'rune authcode invalid')
+
+    with ThreadPoolExecutor(8) as executor:
+        for fut in [executor.submit(worker, start) for start in range(8)]:
+            fut.result()
+    assert len(mr.cache) <= 8
+
+
+def test_prefixes():
+    secret = bytes(16)
+    server = [runes.Restriction.from_str('method^list'), runes.Restriction.from_str('time<2000000000')]
+    mr = runes.MasterRune(secret, restrictions=server)
+    mr.add_prefix([runes.Restriction.unique_id(1)] + server)
+    plain = runes.MasterRune(secret)
+
+    # Runes which start with all, some or none of the known prefixes.
+    extra = runes.Restriction.from_str('peer=alice')
+    for restrictions in ([],
+                         server[:1],
+                         server,
+                         server + [extra],
+                         [extra] + server,
+                         [runes.Restriction.unique_id(1)],
+                         [runes.Restriction.unique_id(1)] + server,
+                         [runes.Restriction.unique_id(1)] + server + [extra, extra],
+                         [runes.Restriction.unique_id(2)] + server):
+        authcode = check_auth_sha(secret, restrictions)
+        rune = runes.Rune.from_authcode(authcode, restrictions)
+        assert mr.is_rune_authorized(rune)
+        assert plain.is_rune_authorized(rune)
+        assert mr.copy().is_rune_authorized(rune)
+
+        bad = runes.Rune.from_authcode(bytes(32), restrictions)
+        assert not mr.is_rune_authorized(bad)
+
+
+def test_cached_encoding():
+    # Decoding keeps the input as the encoding, where it's canonical.
+    restr = runes.Restriction.from_str('f1=v1|f2=\\=v\\|2')
+    assert restr.alternatives[0].encode() == 'f1=v1'
+    # Unnecessary escapes are dropped.
+    assert restr.alternatives[1].value == '=v|2'
+    assert restr.encode() == 'f1=v1|f2==v\\|2'
+
+    # Changing an alternative changes its encoding.
+    alt = restr.alternatives[0]
+    assert restr._encode_bytes() == b'f1=v1|f2==v\\|2'
+    alt.value = 'x&y'
+    assert restr.encode() == 'f1=x\\&y|f2==v\\|2'
+    assert restr._encode_bytes() == b'f1=x\\&y|f2==v\\|2'
+    alt.cond = '/'
+    alt.field = 'f3'
+    assert alt.encode() == 'f3/x\\&y'
+    assert alt._encode_bytes() == 'f3/x\\&y'.encode()
+    alt.value = 'é'
+    assert restr._encode_bytes() == 'f3/é|f2==v\\|2'.encode('utf8')
+
+    # So do the runes we add them to, and what we authorize.
+    mr = runes.MasterRune(bytes(16))
+    rune = runes.Rune(mr.authcode())
+    rune.add_restriction(restr)
+    assert mr.is_rune_authorized(rune)
+    assert mr.is_rune_authorized(runes.Rune.from_base64(rune.to_base64()))
+    assert runes.Rune.from_str(rune.to_str()) == rune
+
+    # Replacing the alternatives does too.
+    restr.alternatives = [runes.Alternative('f4', '=', '1'), alt]
+    assert restr.encode() == 'f4=1|f3/é'
+    alt.value = 'x'
+    assert restr._encode_bytes() == b'f4=1|f3/x'
+
+
+def test_from_authcode_length():
+    """Restrictions whose length is within 9 bytes of a block boundary still
+    need a whole extra block for the pad"""
+    for vlen in range(50, 70):
+        mr = runes.MasterRune(bytes(16), [runes.Restriction.from_str('f=' + 'x' * vlen + 'é')])
+        rune = runes.Rune.from_base64(mr.to_base64())
+        assert rune.shaobj.state == mr.shaobj.state
+        rune.add_restriction(runes.Restriction.from_str('g=1'))
+        assert mr.is_rune_authorized(rune)
+
+
+def test_mint_many():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    restrictions = [runes.Restriction.from_str('method^list|method=getinfo'),
+                    runes.Restriction.from_str('rate=' + 'x' * 60)]
+
+    ids = [0, 1, 9, 10, 999999, 10**20, 'abc', 'x&y']
+    for version in (None, 2, 'v3', 'a&b', 'c|d', 'e\\f'):
+        minted = mr.mint_many(ids, restrictions, version)
+        for unique_id, runestr in zip(ids, minted):
+            expect = runes.MasterRune(secret, restrictions, unique_id=unique_id, version=version)
+            assert runestr == expect.to_base64()
+            assert mr.is_rune_authorized(runes.Rune.from_base64(runestr))
+    assert list(mr.mint_many([5])) == [runes.MasterRune(secret, unique_id=5).to_base64()]
+
+    # It's a generator, so this works without building a list.
+    minted = mr.mint_many(range(10**12), restrictions)
+    assert next(minted) == runes.MasterRune(secret, restrictions, unique_id=0).to_base64()
+
+    with pytest.raises(ValueError, match='Hyphen not allowed'):
+        list(mr.mint_many(['a-b']))
+    with pytest.raises(ValueError, match='Hyphen not allowed'):
+        list(mr.mint_many([-5]))
+    with pytest.raises(ValueError, match='MasterRune with restrictions'):
+        runes.MasterRune(secret, restrictions).mint_many([1])
+
+
+def test_slots():
+    rune = runes.Rune.from_base64(runes.MasterRune(bytes(16), [runes.Restriction.from_str('f1=1|f2=2')]).to_base64())
+    alt = rune.restrictions[0].alternatives[1]
+    for obj in (rune, rune.restrictions[0], alt):
+        assert not hasattr(obj, '__dict__')
+
+    # Field names are shared between parsed runes.
+    rune2 = runes.Rune.from_base64(rune.to_base64())
+    assert rune2.restrictions[0].alternatives[1].field is alt.field
+
+    # Copies don't share the compiled test (which would hand callables the
+    # original alternative).
+    def callme(a):
+        return None if a is alt2 else "wrong alternative"
+
+    assert alt.test({'f2': '2'}) is None
+    for alt2 in (copy.copy(alt), copy.deepcopy(alt)):
+        assert alt2 == alt
+        assert alt2.test({'f2': callme}) is None
+        alt2.value = '3'
+        assert alt2.encode() == 'f2=3'
+        assert alt.encode() == 'f2=2'
+
+
+def test_check_cache():
+    runes.clear_check_cache()
+    secret = bytes(range(16))
+    runestr = runes.MasterRune(secret, [runes.Restriction.from_str('f1=1')]).to_base64()
+    assert runes.check(secret, runestr, {'f1': 1})
+    assert runes.check_with_reason(secret, runestr, {'f1': 2}) == (False, 'f1: != 1')
+    assert runes.check_with_reason(bytes(16), runestr, {'f1': 1}) == (False, 'rune authcode invalid')
+
+    master = runes.runes._cached_master(secret)
+    assert runes.runes._cached_master(secret) is master
+    assert len(runes.runes._master_cache) == 2
+    # Neither the secret nor its hash (the unrestricted authcode) is a key.
+    for key in runes.runes._master_cache:
+        assert secret not in key
+        assert key != hashlib.sha256(secret).digest()
+
+    # It's bounded.
+    for i in range(runes.runes._MASTER_CACHE_SIZE + 10):
+        runes.check(i.to_bytes(8, 'big'), runestr, {'f1': 1})
+    assert len(runes.runes._master_cache) == runes.runes._MASTER_CACHE_SIZE
+    assert runes.runes._cached_master(secret) is not master
+
+    runes.clear_check_cache()
+    assert len(runes.runes._master_cache) == 0
+    assert runes.check(secret, runestr, {'f1': 1})
+
+
+def test_index():
+    """RuneIndex must give exactly the same answers as are_restrictions_met"""
+    def callme(alt: runes.Alternative):
+        return None if alt.cond == '<' else "called {}".format(alt.encode())
+
+    rune = runes.Rune(bytes(32), unique_id=1,
+                      restrictions=[runes.Restriction.from_str(s)
+                                    for s in ('f1!|f2=2', 'f3<3', 'f4!', 'f2/1|f3>1',
+                                              'f5#', 'f1=1|f4^x', 'f6!|f6=6', 'f3!')])
+    index = rune.index()
+    assert set(index.fields) == {'', 'f1', 'f2', 'f3', 'f4', 'f5', 'f6'}
+
+    fields = ('f1', 'f2', 'f3', 'f4', 'f6', 'other')
+    choices = (None, '1', '2', 'x', 5, callme)
+    for combo in itertools.product(choices, repeat=len(fields)):
+        values = {f: v for f, v in zip(fields, combo) if v is not None}
+        assert index.are_restrictions_met(values) == rune.are_restrictions_met(values), values
+
+    # Lots of restrictions on fields which are never there.
+    rune = runes.Rune(bytes(32), restrictions=[runes.Restriction.from_str('x{}!'.format(i))
+                                               for i in range(100)]
+                      + [runes.Restriction.from_str('time<10')])
+    index = rune.index()
+    assert index.are_restrictions_met({'time': 5}) == (True, '')
+    assert index.are_restrictions_met({'time': 10}) == (False, 'time: >= 10')
+    assert index.are_restrictions_met({'x50': 1}) == (False, 'x50: is present')
+    assert index.are_restrictions_met({}) == (False, 'time: is missing')
+
+
+def test_is_met():
+    """is_met() and failure() must agree with test(), without calling
+    callables twice"""
+    calls = []
+
+    def callme(alt: runes.Alternative):
+        calls.append(alt)
+        return "called {}".format(alt.encode())
+
+    values = ['', '0', '1', '-1', '01', '10', 'x', 'ab', '1-2', 5, -3, True, callme]
+    for cond in ('!', '=', '/', '^', '$', '~', '<', '>', '}', '{', '#'):
+        for value in ('', '1', 'x', '-2'):
+            alt = runes.Alternative('f1', cond, value)
+            restr = runes.Restriction([alt, runes.Alternative('f2', '=', '2')])
+            for vals in [{}] + [{'f1': v} for v in values] + [{'f1': v, 'f2': callme} for v in values]:
+                expect = restr.test(vals)
+                ncalls = len(calls)
+                assert alt.is_met(vals) == (alt.test(vals) is None)
+                assert restr.is_met(vals) == (expect is None)
+                del calls[ncalls:]
+                reason = restr.failure(vals)
+                ncalls = len(calls)
+                if expect is None:
+                    assert reason is None
+                else:
+                    assert str(reason) == expect
+                    assert reason == expect
+                assert len(calls) == ncalls
+
+    secret = bytes(16)
+    rune = runes.MasterRune(secret, [runes.Restriction.from_str('f1=1|f2<2'),
+                                     runes.Restriction.from_str('f3!')])
+    runestr = rune.to_base64()
+    for vals in ({}, {'f1': 1}, {'f2': 1, 'f3': 1}, {'f2': 3}, {'f1': 1, 'f3': 0}):
+        ok, whyfail = rune.are_restrictions_met(vals)
+        assert rune.is_met(vals) == ok
+        assert rune.failure(vals) == (None if ok else whyfail)
+        assert rune.check(runestr, vals) == ok
+        assert runes.check(secret, runestr, vals) == ok
+    assert not rune.check(runestr[:-1], {'f1': 1})
+    assert repr(rune.failure({'f2': 3})) == "Reason('f1: is missing AND f2: >= 2')"
+
+
+def test_from_bytes():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    for restrs in ([], ['f1=1'], ['f1=v\\|x|f2<3', 'f3=café', 'f4=☃\\&'], ['f{}={}'.format(i, 'x' * i) for i in range(40)]):
+        rune = runes.MasterRune(secret, [runes.Restriction.from_str(r) for r in restrs], unique_id=3)
+        runestr = rune.to_base64()
+        binrune = base64.urlsafe_b64decode(runestr)
+        for decoded in (runes.Rune.from_base64(runestr),
+                        runes.Rune.from_base64_bytes(runestr.encode()),
+                        runes.Rune.from_base64_bytes(memoryview(runestr.encode())),
+                        runes.Rune.from_bytes(binrune),
+                        runes.Rune.from_bytes(bytearray(binrune)),
+                        runes.Rune.from_bytes(memoryview(binrune))):
+            assert decoded == rune
+            assert type(decoded.authcode()) is bytes
+            assert mr.is_rune_authorized(decoded)
+            # Length is right, so we can keep adding restrictions.
+            decoded.add_restriction(runes.Restriction.from_str('f9=9'))
+            assert mr.is_rune_authorized(decoded)
+
+    with pytest.raises(ValueError):
+        runes.Rune.from_bytes(bytes(31))
+    with pytest.raises(ValueError):
+        runes.Rune.from_bytes(bytes(32) + b'\xff')
+    assert runes.Rune.from_bytes(bytes(32)).restrictions == []
+    # Same message as always, for a too-short runestring.
+    for short in (base64.urlsafe_b64encode(bytes(31)), base64.urlsafe_b64encode(bytes(31)).decode()):
+        with pytest.raises(ValueError, match='must start with 64 hex digits'):
+            runes.Rune.from_base64(short)
+
+
+def test_pickle():
+    secret = bytes(16)
+    mr = runes.MasterRune(secret)
+    rune = runes.MasterRune(secret, [runes.Restriction.from_str(s)
+                                     for s in ('f1=v\\|1|f2<3', 'f3=café', 'f4#')],
+                            unique_id=5)
+    rune = runes.Rune.from_base64(rune.to_base64())
+    for proto in range(pickle.HIGHEST_PROTOCOL + 1):
+        alt = rune.restrictions[0].alternatives[0]
+        assert pickle.loads(pickle.dumps(alt, proto)) == alt
+        assert pickle.loads(pickle.dumps(rune.restrictions[0], proto)) == rune.restrictions[0]
+        rune2 = pickle.loads(pickle.dumps(rune, proto))
+        assert type(rune2) is runes.Rune
+        assert rune2 == rune
+        assert mr.is_rune_authorized(rune2)
+        assert rune2.are_restrictions_met({'f2': 1, 'f3': 'café'}) == (True, '')
+
+    for snapshot in (rune.to_snapshot(), runes.MasterRune(secret).to_snapshot()):
+        rune2 = runes.Rune.from_snapshot(snapshot)
+        assert type(rune2) is runes.Rune
+        assert mr.is_rune_authorized(rune2)
+        assert rune2.to_snapshot() == snapshot
+        # Length was carried over, so we can add restrictions.
+        rune2.add_restriction(runes.Restriction.from_str('f5=5'))
+        assert mr.is_rune_authorized(rune2)
+    assert runes.Rune.from_snapshot(rune.to_snapshot()) == rune
+    assert runes.Rune.from_snapshot(rune.to_snapshot()).restrictions[1].alternatives[1].field is \
+        rune.restrictions[1].alternatives[1].field
+
+    with pytest.raises(ValueError, match='Not a rune snapshot'):
+        runes.Rune.from_snapshot(b'garbage')
+    with pytest.raises(ValueError, match='Unknown rune snapshot version 99'):
+        runes.Rune.from_snapshot(marshal.dumps((99, bytes(32), 64, [])))
+
+    # The secret's hash state doesn't leave by accident.
+    with pytest.raises(TypeError, match='MasterRune'):
+        pickle.dumps(mr)
+    with pytest.raises(TypeError):
+        runes.MasterRune.from_snapshot(mr.to_snapshot())
@@ -0,0 +1,51 @@
+import random
+import runes
+from runes.runeset import RuneSet
+
+
+def test_runeset_matches():
+    """RuneSet must agree with are_restrictions_met() on every rune"""
+    rng = random.Random(1)
+    fields = ('f1', 'f2', 'f3')
+    condvals = ('', '1', '10', '-3', 'ab', 'abc', 'b', 'x1')
+    conds = ('!', '=', '/', '^', '$', '~', '<', '>', '}', '{', '#')
+
+    def random_restriction() -> runes.Restriction:
+        return runes.Restriction([runes.Alternative(rng.choice(fields), rng.choice(conds), rng.choice(condvals))
+                                  for _ in range(rng.randint(1, 3))])
+
+    runelist = [runes.Rune(bytes(32), restrictions=[random_restriction() for _ in range(rng.randint(0, 3))])
+                for _ in range(500)]
+    # Some with unique_ids, with and without versions.
+    runelist += [runes.Rune(bytes(32), unique_id=i, version=v) for i in range(3) for v in (None, 2)]
+    runeset = RuneSet(runelist)
+    assert len(runeset) == len(runelist)
+
+    def callme(alt):
+        return None if alt.cond in ('=', '<') else 'nope'
+
+    values_pool = condvals + ('abcd', 'zzz', 5, 0, 100, True, callme)
+    for _ in range(300):
+        values = {f: rng.choice(values_pool) for f in fields if rng.random() < 0.7}
+        expect = [i for i, r in enumerate(runelist) if r.are_restrictions_met(values)[0]]
+        assert runeset.matching(values) == expect, values
+    assert runeset.matching_runes({}) == [r for r in runelist if r.are_restrictions_met({})[0]]
+
+
+def test_runeset_shared_restrictions():
+    common = [runes.Restriction.from_str('method^list|method=getinfo'),
+              runes.Restriction.from_str('time<2000')]
+    runeset = RuneSet()
+    for i in range(1000):
+        idx = runeset.add(runes.Rune(bytes(32), restrictions=common + [runes.Restriction.from_str('peer={}'.format(i))]))
+        assert idx == i
+    # Identical restrictions are only indexed once.
+    assert len(runeset._rids) == 1002
+    assert runeset.matching({'method': 'listpeers', 'time': 1000, 'peer': '7'}) == [7]
+    assert runeset.matching({'method': 'pay', 'time': 1000, 'peer': '7'}) == []
+    assert runeset.matching({'method': 'getinfo', 'time': 3000, 'peer': '7'}) == []
+    # A restriction repeated in one rune only needs passing once.
+    rune = runes.Rune(bytes(32), restrictions=[runes.Restriction.from_str('time<5')] * 2)
+    assert runeset.matching_runes({'time': 1}) == []
+    idx = runeset.add(rune)
+    assert runeset.matching({'time': 1}) == [idx]